@@ -0,0 +1,250 @@
+from datetime import datetime
+
+
+import numpy as np
+
+
+from evaluation import batch_evaluate
+
+
+class CMA_ES:
+    '''
+    The Covariance Matrix Adaptation Evolution Strategy (CMA-ES), as in
+    pygmo's cmaes, with the offspring of a generation sampled all at
+    once: with C = B D^2 B^T the covariance matrix, the
+    (population_size, dim) matrix of offspring is
+        mean + sigma * (Z * D) @ B^T
+    Z being a matrix of standard normal draws, i.e. one matrix multiply
+    per generation.
+    The eigendecomposition of C, in O(dim^3), is only done every
+    eigen_interval generations (lazy update, B and D being reused in
+    between), which is what makes large dimensions tractable.
+    With sep, C is kept diagonal (sep-CMA-ES): B is the identity and all
+    the updates are in O(dim), with learning rates increased by
+    (dim + 2) / 3 as recommended.
+    The search is done in the bounds normalised to [0, 1], so that
+    sigma0 is relative to the width of the bounds.
+    '''
+    def __init__(self, problem, population_size, params):
+        '''
+        Parameters
+        ----------
+        - problem: the problem to optimise, pygmo-like, i.e. providing
+            get_bounds() and fitness(x) (or batch_fitness(dvs))
+        - population_size: the number of offspring per generation
+            (lambda), at least 2. The mean is initialised as the best
+            of a first random population of that size
+        - params: dictionary of parameters (see helpers.cma_es):
+            * nb_generation: the number of generations
+            * sigma0: the initial step size, relative to the width of
+                the bounds, default 0.5
+            * ftol: stopping criteria on the function tolerance, i.e.
+                the fitness range of the offspring, default 1e-6
+            * xtol: stopping criteria on the step tolerance, i.e. the
+                L1 norm of the move of the mean, default 1e-6
+            * cc, cs, c1, cmu: the learning rates of the evolution
+                paths and of the rank-one and rank-mu updates, default
+                None (Hansen's defaults)
+            * sep: whether to use the separable (diagonal) variant,
+                default False
+            * eigen_interval: the number of generations between two
+                eigendecompositions of C, default None, i.e.
+                max(1, 1 / (10 * dim * (c1 + cmu))) as recommended
+            * force_bounds: whether to put the offspring out of the
+                bounds on the bounds, default False (as pygmo, they
+                are evaluated as they are)
+            * seed: the seed of the random generator, default None
+        '''
+        self.problem = problem
+        self.size = population_size
+        if self.size < 2:
+            raise ValueError("the population size must be at least 2")
+        self.nb_generation = params["nb_generation"]
+        self.sigma0 = params.get("sigma0", 0.5)
+        self.ftol = params.get("ftol", 1e-6)
+        self.xtol = params.get("xtol", 1e-6)
+        self.sep = params.get("sep", False)
+        self.force_bounds = params.get("force_bounds", False)
+        self.rng = np.random.default_rng(params.get("seed", None))
+
+        self.lbound, self.ubound = \
+            (np.array(bounds, dtype=np.float64)
+             for bounds in problem.get_bounds())
+        self.width = self.ubound - self.lbound
+        self.dim = n = self.lbound.shape[0]
+        self.nb_evaluations = 0
+
+        # recombination weights of the mu best offspring
+        self.mu = self.size // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / np.sum(self.weights**2)
+
+        # learning rates (Hansen's defaults)
+        mueff = self.mueff
+        cc = (4 + mueff/n) / (n + 4 + 2*mueff/n)
+        cs = (mueff + 2) / (n + mueff + 5)
+        c1 = 2 / ((n + 1.3)**2 + mueff)
+        cmu = 2 * (mueff - 2 + 1/mueff) / ((n + 2)**2 + mueff)
+        if self.sep:
+            c1, cmu = c1 * (n + 2) / 3, cmu * (n + 2) / 3
+        self.cc = params.get("cc", None) or cc
+        self.cs = params.get("cs", None) or cs
+        self.c1 = params.get("c1", None) or c1
+        self.cmu = min(1 - self.c1, params.get("cmu", None) or cmu)
+        self.damps = 1 + 2*max(0, np.sqrt((mueff - 1) / (n + 1)) - 1) \
+            + self.cs
+        self.chiN = np.sqrt(n) * (1 - 1/(4*n) + 1/(21*n**2))
+
+        self.eigen_interval = params.get("eigen_interval", None)
+        if self.eigen_interval is None:
+            self.eigen_interval = max(
+                1, int(1 / (10 * n * (self.c1 + self.cmu))))
+
+    def evaluate(self, individuals):
+        '''
+        Compute the fitness of a (nb_individuals, dim) matrix of
+        individuals (see evaluation.batch_evaluate), counting the
+        evaluations
+        '''
+        self.nb_evaluations = self.nb_evaluations + individuals.shape[0]
+        return(batch_evaluate(self.problem, individuals))
+
+    def to_problem(self, normalised):
+        '''
+        From the normalised search space to the problem's one
+        '''
+        return(self.lbound + normalised * self.width)
+
+    def sample(self, mean, sigma, B, D):
+        '''
+        Sample all the offspring of a generation at once
+        Return
+        ------
+        - Z: the standard normal draws, (population_size, dim)
+        - Y: the steps, Z scaled by D and rotated by B, i.e. drawn from
+            N(0, C)
+        - X: the offspring in the normalised space, mean + sigma * Y
+        With force_bounds, Y and Z are recomputed from the offspring
+        put on the bounds: Y = (X - mean) / sigma and Z = D^-1 B^T Y,
+        i.e. Y B / D for the rows
+        '''
+        Z = self.rng.standard_normal((self.size, self.dim))
+        Y = Z * D
+        if not self.sep:
+            Y = Y @ B.T
+        X = mean + sigma * Y
+        if self.force_bounds:
+            np.clip(X, 0, 1, out=X)
+            Y = (X - mean) / sigma
+            Z = Y / D if self.sep else (Y @ B) / D
+        return(Z, Y, X)
+
+    def evolve(self):
+        '''
+        Do the thing !
+        Return
+        ------
+        - log: for every generation, (Gen, Fevals, Best, dx, df, sigma)
+            as pygmo's cmaes logs, i.e. the generation, the number of
+            function evaluations, the best fitness so far, the dx and
+            df stopping criteria and the step size
+        - duration: the total duration of the resolution (a timedelta)
+        - champion_f: the best fitness, as an array of dimension (1, )
+        - champion_x: the best individual
+        '''
+        startt = datetime.now()
+        n = self.dim
+
+        # the mean starts from the best of a random population
+        X = self.rng.uniform(size=(self.size, n))
+        fitness = self.evaluate(self.to_problem(X))
+        best_idx = np.argmin(fitness)
+        mean = X[best_idx].copy()
+        champion_f = fitness[best_idx:best_idx + 1].copy()
+        champion_x = self.to_problem(X[best_idx])
+
+        sigma = self.sigma0
+        pc = np.zeros(n)
+        ps = np.zeros(n)
+        # C = B diag(D^2) B^T, C being only its diagonal with sep
+        if self.sep:
+            C = np.ones(n)
+            B = None
+        else:
+            C = np.eye(n)
+            B = np.eye(n)
+        D = np.ones(n)
+
+        log = []
+        for generation in range(1, self.nb_generation + 1):
+            Z, Y, X = self.sample(mean, sigma, B, D)
+            fitness = self.evaluate(self.to_problem(X))
+            order = np.argsort(fitness)
+            if fitness[order[0]] < champion_f[0]:
+                champion_f[0] = fitness[order[0]]
+                champion_x = self.to_problem(X[order[0]])
+
+            # recombination
+            selected = order[:self.mu]
+            y_mean = self.weights @ Y[selected]
+            z_mean = self.weights @ Z[selected]
+            old_mean = mean
+            mean = mean + sigma * y_mean
+
+            # evolution paths (C^-1/2 y_mean is B z_mean, B and D being
+            # the ones the offspring were sampled with)
+            cs, cc = self.cs, self.cc
+            ps = (1 - cs)*ps + np.sqrt(cs * (2 - cs) * self.mueff) * \
+                (z_mean if self.sep else B @ z_mean)
+            hsig = np.linalg.norm(ps) \
+                / np.sqrt(1 - (1 - cs)**(2*generation)) / self.chiN \
+                < 1.4 + 2/(n + 1)
+            pc = (1 - cc)*pc + hsig * np.sqrt(cc * (2 - cc) * self.mueff) \
+                * y_mean
+
+            # covariance matrix: rank-one and rank-mu updates
+            c1, cmu = self.c1, self.cmu
+            decay = 1 - c1 - cmu + c1 * (1 - hsig) * cc * (2 - cc)
+            if self.sep:
+                C = decay*C + c1*pc**2 \
+                    + cmu * (self.weights @ Y[selected]**2)
+                D = np.sqrt(C)
+            else:
+                weighted = Y[selected].T * self.weights
+                C = decay*C + c1*np.outer(pc, pc) \
+                    + cmu * (weighted @ Y[selected])
+                # lazy eigendecomposition
+                if generation % self.eigen_interval == 0:
+                    C = np.triu(C) + np.triu(C, 1).T
+                    eigenvalues, B = np.linalg.eigh(C)
+                    D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+            # step size
+            sigma = sigma * np.exp((cs / self.damps)
+                                   * (np.linalg.norm(ps) / self.chiN - 1))
+
+            # stopping criteria
+            dx = np.abs((mean - old_mean) * self.width).sum()
+            df = np.abs(fitness[order[-1]] - fitness[order[0]])
+            log.append((generation, self.nb_evaluations, champion_f[0],
+                        dx, df, sigma))
+            if dx < self.xtol or df < self.ftol:
+                break
+
+        duration = (datetime.now() - startt)
+
+        return(log, duration, champion_f, champion_x)
+
+
+def cmaes(problem, population_size, params):
+    '''
+    Execute the CMA-ES algorithm on an optimisation problem with the
+    population size and parameters specified (see CMA_ES), like
+    helpers.cma_es does with pygmo
+    Return
+    ------
+    - log, duration, champion_f, champion_x: see CMA_ES.evolve
+    '''
+    algo = CMA_ES(problem, population_size, params)
+    return(algo.evolve())
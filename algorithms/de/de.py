@@ -0,0 +1,291 @@
+from datetime import datetime
+
+
+import numpy as np
+
+
+from evaluation import batch_evaluate
+
+
+# Mutation variants, numbered as in pygmo's de / sade:
+# (base vector, number of difference vectors, crossover)
+VARIANTS = {
+    1: ("best", 1, "exp"),
+    2: ("rand", 1, "exp"),
+    3: ("rand-to-best", 1, "exp"),
+    4: ("best", 2, "exp"),
+    5: ("rand", 2, "exp"),
+    6: ("best", 1, "bin"),
+    7: ("rand", 1, "bin"),
+    8: ("rand-to-best", 1, "bin"),
+    9: ("best", 2, "bin"),
+    10: ("rand", 2, "bin"),
+    11: ("rand", 3, "exp"),
+    12: ("rand", 3, "bin"),
+    13: ("best", 3, "exp"),
+    14: ("best", 3, "bin"),
+    15: ("rand-to-current", 2, "exp"),
+    16: ("rand-to-current", 2, "bin"),
+    17: ("rand-to-best-and-current", 2, "exp"),
+    18: ("rand-to-best-and-current", 2, "bin"),
+    }
+
+
+class Differential_Evolution:
+    '''
+    The Differential Evolution algorithm (DE), optionally self-adaptive
+    (jDE), working on the whole population matrix at once:
+    1. mutation: for every individual x, a mutant vector is built from
+        a base vector and difference vectors of other (random, distinct)
+        individuals, e.g. rand/1: r0 + F * (r1 - r2)
+    2. crossover: the trial vector takes the genes of the mutant either
+        independently with probability CR (binomial, "bin") or as one
+        circular sequence whose length is geometric with ratio CR
+        (exponential, "exp")
+    3. bounds handling of the trial vectors
+    4. selection: a trial vector replaces its target if it is not worse
+    All the trial vectors of a generation are evaluated at once, through
+    the problem's batch_fitness if available.
+    '''
+    def __init__(self, problem, population_size, params):
+        '''
+        Parameters
+        ----------
+        - problem: the problem to optimise, pygmo-like, i.e. providing
+            get_bounds() and fitness(x) (or batch_fitness(dvs))
+        - population_size: the size of the population. Every
+            individual being mutated from 2 * nb_differences + 1 other
+            individuals, at least 4 for the variants using 1 difference
+            vector, 6 for 2 and 8 for 3 (see VARIANTS)
+        - params: dictionary of parameters:
+            * nb_generation: the number of generations
+            * variant: the mutation variant, numbered as pygmo's
+                (see VARIANTS), default 2 (rand/1/exp)
+            * variant_adptv: adaptation of F and CR. One of:
+                0 -> none, F and CR are fixed
+                1 -> jDE: every individual has its own F and CR,
+                    regenerated with probability 0.1 and kept along
+                    with the trial vectors that succeed
+              default 1
+            * F, CR: the scale factor and crossover rate (initial
+                values with jDE), default 0.8 and 0.9
+            * bounds: the handling of the genes out of the bounds.
+                One of: ("random", "clip", "reflect", "midpoint"),
+                default "random" (redrawn uniformly in the bounds).
+                midpoint: between the target gene and the bound
+            * ftol: stopping criteria on the function tolerance, i.e.
+                the fitness range of the population, default 1e-6
+            * xtol: stopping criteria on the step tolerance, i.e. the
+                L1 distance between the best and worst individuals,
+                default 1e-6
+            * seed: the seed of the random generator, default None
+        '''
+        self.problem = problem
+        self.size = population_size
+        self.nb_generation = params["nb_generation"]
+        self.variant = params.get("variant", 2)
+        self.variant_adptv = params.get("variant_adptv", 1)
+        self.F = params.get("F", 0.8)
+        self.CR = params.get("CR", 0.9)
+        self.bounds = params.get("bounds", "random")
+        self.ftol = params.get("ftol", 1e-6)
+        self.xtol = params.get("xtol", 1e-6)
+        self.rng = np.random.default_rng(params.get("seed", None))
+
+        if self.variant not in VARIANTS or \
+           self.variant_adptv not in (0, 1) or \
+           self.bounds not in ("random", "clip", "reflect", "midpoint"):
+            raise NotImplementedError
+        self.base, self.nb_differences, self.crossover_type = \
+            VARIANTS[self.variant]
+        if self.size < 2*self.nb_differences + 2:
+            raise ValueError("the population size must be at least %d for "
+                             "the variant %d" % (2*self.nb_differences + 2,
+                                                 self.variant))
+
+        self.lbound, self.ubound = \
+            (np.array(bounds, dtype=np.float64)
+             for bounds in problem.get_bounds())
+        self.dim = self.lbound.shape[0]
+        self.nb_evaluations = 0
+
+    def evaluate(self, individuals):
+        '''
+        Compute the fitness of a (nb_individuals, dim) matrix of
+        individuals (see evaluation.batch_evaluate), counting the
+        evaluations
+        '''
+        self.nb_evaluations = self.nb_evaluations + individuals.shape[0]
+        return(batch_evaluate(self.problem, individuals))
+
+    def get_random_indexes(self, nb_indexes):
+        '''
+        Return
+        ------
+        - for every individual i, nb_indexes distinct random indexes of
+            other individuals, as a (population_size, nb_indexes) array
+        '''
+        keys = self.rng.uniform(size=(self.size, self.size))
+        np.fill_diagonal(keys, 2)
+        return(np.argpartition(keys, nb_indexes, axis=1)[:, :nb_indexes])
+
+    def mutate(self, individuals, best, F):
+        '''
+        Build the mutant vectors of all the individuals
+        Parameters
+        ----------
+        - individuals: the population matrix
+        - best: the best individual of the population
+        - F: the scale factors, of dimension (population_size, 1)
+        Return
+        ------
+        - the mutant vectors, as a (population_size, dim) matrix
+        '''
+        nb_vectors = 2*self.nb_differences + 1
+        idxs = self.get_random_indexes(nb_vectors)
+        vectors = individuals[idxs]
+        differences = (vectors[:, 1::2] - vectors[:, 2::2]).sum(axis=1)
+
+        if self.base == "best":
+            return(best + F*differences)
+        elif self.base == "rand":
+            return(vectors[:, 0] + F*differences)
+        elif self.base == "rand-to-best":
+            return(individuals + F*(best - individuals) + F*differences)
+        elif self.base == "rand-to-current":
+            # r0 + F * (r1 - x) + F * (r3 - r4)
+            return(vectors[:, 0] + F*(vectors[:, 1] - individuals)
+                   + F*(vectors[:, 3] - vectors[:, 4]))
+        else:
+            # rand-to-best-and-current: r0 + F * (r1 - r2) + F * (best - x)
+            return(vectors[:, 0] + F*(vectors[:, 1] - vectors[:, 2])
+                   + F*(best - individuals))
+
+    def crossover(self, individuals, mutants, CR):
+        '''
+        Build the trial vectors from the individuals and their mutants
+        Parameters
+        ----------
+        - individuals, mutants: (population_size, dim) matrices
+        - CR: the crossover rates, of dimension (population_size, 1)
+        Return
+        ------
+        - the trial vectors, as a (population_size, dim) matrix
+        '''
+        positions = np.arange(self.dim)
+        starts = self.rng.integers(self.dim, size=(self.size, 1))
+        if self.crossover_type == "bin":
+            # every gene with probability CR, and at least one gene
+            mask = (self.rng.uniform(size=(self.size, self.dim)) < CR) | \
+                   (positions == starts)
+        else:
+            # a circular sequence from a random start, whose length L
+            # is such that P(L = k) = CR^(k - 1) (1 - CR)
+            lengths = self.rng.geometric(np.maximum(1 - CR, 1e-12))
+            mask = ((positions - starts) % self.dim) < lengths
+        return(np.where(mask, mutants, individuals))
+
+    def handle_bounds(self, trials, individuals):
+        '''
+        Bring the genes of the trial vectors back within the bounds
+        (inplace)
+        '''
+        low = trials < self.lbound
+        high = trials > self.ubound
+        out = low | high
+        if not out.any():
+            return(trials)
+
+        if self.bounds == "random":
+            random = self.rng.uniform(self.lbound, self.ubound,
+                                      size=trials.shape)
+            trials[out] = random[out]
+        elif self.bounds == "clip":
+            np.clip(trials, self.lbound, self.ubound, out=trials)
+        elif self.bounds == "reflect":
+            width = self.ubound - self.lbound
+            reflected = np.abs((trials - self.lbound) % (2*width) - width)
+            trials[out] = (self.ubound - reflected)[out]
+        else:
+            bound = np.where(low, self.lbound, self.ubound)
+            trials[out] = ((individuals + bound) / 2)[out]
+        return(trials)
+
+    def evolve(self):
+        '''
+        Do the thing !
+        Return
+        ------
+        - log: for every generation, (Gen, Fevals, Best, F, CR, dx, df)
+            as pygmo's sade logs, i.e. the generation, the number of
+            function evaluations, the best fitness, the mean F and CR,
+            and the dx and df stopping criteria
+        - duration: the total duration of the resolution (a timedelta)
+        - champion_f: the best fitness, as an array of dimension (1, )
+        - champion_x: the best individual
+        '''
+        startt = datetime.now()
+        individuals = self.rng.uniform(self.lbound, self.ubound,
+                                       size=(self.size, self.dim))
+        fitness = self.evaluate(individuals)
+        F = np.full((self.size, 1), float(self.F))
+        CR = np.full((self.size, 1), float(self.CR))
+
+        log = []
+        for generation in range(1, self.nb_generation + 1):
+            # jDE: new F and CR for some individuals, used by their
+            # trial vectors only
+            trial_F, trial_CR = F, CR
+            if self.variant_adptv == 1:
+                new_F = self.rng.uniform(size=F.shape) < 0.1
+                new_CR = self.rng.uniform(size=CR.shape) < 0.1
+                trial_F = np.where(new_F,
+                                   0.1 + 0.9*self.rng.uniform(size=F.shape),
+                                   F)
+                trial_CR = np.where(new_CR, self.rng.uniform(size=CR.shape),
+                                    CR)
+
+            best = individuals[np.argmin(fitness)]
+            mutants = self.mutate(individuals, best, trial_F)
+            trials = self.crossover(individuals, mutants, trial_CR)
+            trials = self.handle_bounds(trials, individuals)
+            trials_fitness = self.evaluate(trials)
+
+            # selection: the trial vectors not worse than their target
+            # replace them (with their F and CR)
+            better = trials_fitness <= fitness
+            individuals[better] = trials[better]
+            fitness[better] = trials_fitness[better]
+            F = np.where(better[:, np.newaxis], trial_F, F)
+            CR = np.where(better[:, np.newaxis], trial_CR, CR)
+
+            # stopping criteria
+            best_idx = np.argmin(fitness)
+            worst_idx = np.argmax(fitness)
+            dx = np.abs(individuals[worst_idx] - individuals[best_idx]).sum()
+            df = np.abs(fitness[worst_idx] - fitness[best_idx])
+            log.append((generation, self.nb_evaluations, fitness[best_idx],
+                        F.mean(), CR.mean(), dx, df))
+            if dx < self.xtol or df < self.ftol:
+                break
+
+        duration = (datetime.now() - startt)
+        best_idx = np.argmin(fitness)
+        champion_f = fitness[best_idx:best_idx + 1]
+        champion_x = individuals[best_idx].copy()
+
+        return(log, duration, champion_f, champion_x)
+
+
+def de(problem, population_size, params):
+    '''
+    Execute the Differential Evolution algorithm on an optimisation
+    problem with the population size and parameters specified (see
+    Differential_Evolution), like helpers.sade does with pygmo
+    Return
+    ------
+    - log, duration, champion_f, champion_x: see
+        Differential_Evolution.evolve
+    '''
+    algo = Differential_Evolution(problem, population_size, params)
+    return(algo.evolve())
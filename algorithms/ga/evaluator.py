@@ -0,0 +1,269 @@
+import os
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+import numpy as np
+
+
+from evaluation import batch_evaluate
+
+
+class Serial_Evaluator:
+    '''
+    Evaluate the fitness of individuals in the current process,
+    i.e. simply call the problem's fitness function.
+    '''
+    def __init__(self, problem, evaluator_params={}):
+        '''
+        Parameters
+        ----------
+        - the problem to evaluate
+        - evaluator_params: unused
+        '''
+        self.problem = problem
+
+    def evaluate(self, individuals):
+        '''
+        Return
+        ------
+        - the fitness of the individuals as a numpy ndarray of
+            dimension (nb_individuals, )
+        '''
+        return(batch_evaluate(self.problem, individuals))
+
+    def close(self):
+        pass
+
+
+class Process_Pool_Evaluator:
+    '''
+    Evaluate the fitness of individuals across a pool of processes:
+    1. The problem is shipped once to every worker when the pool
+        starts, its numpy arrays (e.g. the cities coordinates or the
+        distance matrix of a TSP problem) being moved to shared memory
+        instead of being pickled.
+    2. For every evaluation, the individuals are copied into a shared
+        memory buffer, split into chunks, and every worker evaluates the
+        chunks it is given directly from the shared buffer.
+    Small populations (less than min_parallel_size individuals) are
+    evaluated in the current process, as IPC would dominate.
+    The workers are spawned rather than forked: forking a process in
+    which the thread pool of numba's parallel layer is running (e.g.
+    after a GA run with the numba backend) makes the interpreter hang
+    on exit.
+    The pool and shared memory are released with close(), or else when
+    the evaluator is garbage collected or at exit (weakref.finalize).
+    '''
+    def __init__(self, problem, evaluator_params={}):
+        '''
+        Parameters
+        ----------
+        - the problem to evaluate
+        evaluator_params includes (all optional):
+        - nb_workers: the number of processes (default os.cpu_count())
+        - nb_chunks: the number of chunks the individuals are split into
+            (default nb_workers)
+        - min_parallel_size: the minimum number of individuals to
+            evaluate in parallel (default 256)
+        - start_method: the multiprocessing start method of the
+            workers, one of ("spawn", "forkserver", "fork"),
+            default "spawn"
+        '''
+        self.problem = problem
+        self.nb_workers = evaluator_params.get("nb_workers", os.cpu_count())
+        self.nb_chunks = evaluator_params.get("nb_chunks", self.nb_workers)
+        self.min_parallel_size = \
+            evaluator_params.get("min_parallel_size", 256)
+        self.start_method = evaluator_params.get("start_method", "spawn")
+
+        # move the problem's arrays to shared memory (self.shm: all the
+        # shared memory owned, the problem's and the individuals' one)
+        self.shm = []
+        shared_problem = _Shared_Problem(problem)
+        for name, value in vars(problem).items():
+            if isinstance(value, np.ndarray):
+                shm, shared_array = _share_array(value)
+                self.shm.append(shm)
+                shared_problem.arrays[name] = shared_array
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.nb_workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_worker,
+            initargs=(shared_problem,))
+        # release the pool and the shared memory even if close() is
+        # not called (the finalizer holding no reference to self)
+        self.finalizer = weakref.finalize(self, _release, self.pool,
+                                          self.shm)
+
+        # shared buffer of individuals, (re)allocated on demand
+        self.individuals_shm = None
+        self.individuals = None
+
+    def evaluate(self, individuals):
+        '''
+        Return
+        ------
+        - the fitness of the individuals as a numpy ndarray of
+            dimension (nb_individuals, )
+        '''
+        nb_individuals = individuals.shape[0]
+        if nb_individuals < self.min_parallel_size:
+            return(batch_evaluate(self.problem, individuals))
+
+        # copy the individuals into the shared buffer
+        if self.individuals is None or \
+           self.individuals.shape[0] < nb_individuals or \
+           self.individuals.shape[1:] != individuals.shape[1:] or \
+           self.individuals.dtype != individuals.dtype:
+            self.release_individuals()
+            self.individuals_shm, self.shared_individuals = \
+                _share_array(individuals)
+            self.shm.append(self.individuals_shm)
+            self.individuals = self.shared_individuals.attach(
+                self.individuals_shm)
+        else:
+            self.individuals[:nb_individuals] = individuals
+
+        # evaluate the chunks in the workers
+        bounds = np.linspace(0, nb_individuals,
+                             min(self.nb_chunks, nb_individuals) + 1)
+        bounds = bounds.astype(np.int64)
+        futures = [self.pool.submit(_evaluate_chunk,
+                                    self.shared_individuals, start, stop)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        fitness = np.empty(nb_individuals)
+        for start, stop, future in zip(bounds[:-1], bounds[1:], futures):
+            fitness[start:stop] = future.result()
+
+        return(fitness)
+
+    def release_individuals(self):
+        if self.individuals_shm is not None:
+            self.individuals = None
+            self.shm.remove(self.individuals_shm)
+            _release_shared_memory(self.individuals_shm)
+            self.individuals_shm = None
+
+    def close(self):
+        '''
+        Stop the workers and release the shared memory (only the first
+        call does)
+        '''
+        self.individuals = None
+        self.finalizer()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_evaluator(problem, evaluator="serial", evaluator_params={}):
+    '''
+    Build an evaluator for a problem. evaluator is one of:
+        ("serial", "process") or an already built evaluator
+    '''
+    if evaluator == "serial":
+        return(Serial_Evaluator(problem, evaluator_params))
+    elif evaluator == "process":
+        return(Process_Pool_Evaluator(problem, evaluator_params))
+    elif hasattr(evaluator, "evaluate"):
+        return(evaluator)
+    else:
+        raise NotImplementedError
+
+
+# ------------------------------------------
+# Shared memory helpers (parent and workers)
+# ------------------------------------------
+class _Shared_Array:
+    '''
+    Description of a numpy array stored in shared memory,
+    cheap to pickle
+    '''
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def attach(self, shm):
+        return(np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf))
+
+
+class _Shared_Problem:
+    '''
+    A problem whose numpy arrays have been moved to shared memory
+    '''
+    def __init__(self, problem):
+        self.problem = problem
+        self.arrays = {}
+
+    def __getstate__(self):
+        # the problem is pickled without its (shared) arrays
+        problem = object.__new__(type(self.problem))
+        problem.__dict__.update({name: value for name, value
+                                 in vars(self.problem).items()
+                                 if name not in self.arrays})
+        return({"problem": problem, "arrays": self.arrays})
+
+
+def _release_shared_memory(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # (an array still uses it, e.g. at exit: only unlinked)
+        pass
+    shm.unlink()
+
+
+def _release(pool, shms):
+    pool.shutdown()
+    for shm in shms:
+        _release_shared_memory(shm)
+    shms.clear()
+
+
+def _share_array(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared_array = _Shared_Array(shm.name, array.shape, array.dtype)
+    shared_array.attach(shm)[...] = array
+    return(shm, shared_array)
+
+
+def _attach_shared_memory(name):
+    # the workers share the resource tracker of the parent process,
+    # which owns (and unlinks) the shared memory
+    return(shared_memory.SharedMemory(name=name))
+
+
+# state of a worker process: the problem (and its shared memory)
+# and the last shared buffer of individuals
+_worker_problem = None
+_worker_problem_shm = []
+_worker_individuals_shm = None
+
+
+def _init_worker(shared_problem):
+    global _worker_problem
+    _worker_problem = shared_problem.problem
+    for name, shared_array in shared_problem.arrays.items():
+        shm = _attach_shared_memory(shared_array.name)
+        _worker_problem_shm.append(shm)
+        setattr(_worker_problem, name, shared_array.attach(shm))
+
+
+def _evaluate_chunk(shared_individuals, start, stop):
+    global _worker_individuals_shm
+    if _worker_individuals_shm is None or \
+       _worker_individuals_shm.name != shared_individuals.name:
+        if _worker_individuals_shm is not None:
+            _worker_individuals_shm.close()
+        _worker_individuals_shm = \
+            _attach_shared_memory(shared_individuals.name)
+    individuals = shared_individuals.attach(_worker_individuals_shm)
+    return(batch_evaluate(_worker_problem, individuals[start:stop]))
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+
+
+import numpy as np
+
+
+class Fitness_Cache:
+    '''
+    A memoization cache of fitness values, in front of a fitness
+    function evaluating a (nb_individuals, dim) matrix of individuals.
+    Individuals are turned into hashable keys:
+    - "exact": the individual's genes
+    - "permutation": the canonical form of a cyclic and symmetric
+        permutation (e.g. a TSP path), i.e. rotated to start with its
+        smallest gene (city 1) and in the direction where the second
+        gene is smaller than the last one. The same cycle, whatever its
+        rotation or direction, has the same key.
+    - "quantised": the genes rounded to a multiple of quantum (for
+        continuous problems)
+    The cache holds at most max_memory bytes (approximately) and evicts
+    the least recently used fitness values first.
+    '''
+    # approximate memory overhead of an entry (key and fitness objects,
+    # dictionary slot and LRU links), on top of the key's bytes
+    ENTRY_OVERHEAD = 160
+
+    def __init__(self, fitness_func, cache_params={}):
+        '''
+        Parameters
+        ----------
+        - the fitness function to cache
+        cache_params includes (all optional):
+        - key: the kind of key. One of:
+            ("exact", "permutation", "quantised"), default "exact"
+        - quantum: the quantisation step of "quantised" keys,
+            default 1e-9
+        - max_memory: the maximum memory of the cache in bytes,
+            default 64MB
+        '''
+        self.fitness_func = fitness_func
+        self.key = cache_params.get("key", "exact")
+        self.quantum = cache_params.get("quantum", 1e-9)
+        self.max_memory = cache_params.get("max_memory", 64*1024*1024)
+        if self.key not in ("exact", "permutation", "quantised"):
+            raise NotImplementedError
+
+        self.cache = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_keys(self, individuals):
+        '''
+        Return
+        ------
+        - the keys of the individuals, as a list of bytes
+        '''
+        if self.key == "permutation":
+            individuals = self.get_canonical_permutations(individuals)
+        elif self.key == "quantised":
+            individuals = np.round(individuals / self.quantum)
+            individuals = individuals.astype(np.int64)
+        individuals = np.ascontiguousarray(individuals)
+        return([individual.tobytes() for individual in individuals])
+
+    def get_canonical_permutations(self, individuals):
+        '''
+        Rotate every permutation to start with its smallest gene and
+        reverse its direction if its second gene is greater than its
+        last one
+        '''
+        dim = individuals.shape[1]
+        positions = np.arange(dim)
+        starts = np.argmin(individuals, axis=1)[:, np.newaxis]
+        rotated = np.take_along_axis(individuals, (starts + positions) % dim,
+                                     axis=1)
+        reverse = (rotated[:, 1] > rotated[:, -1])[:, np.newaxis]
+        # reversed cycle from the first gene: positions 0, -1, -2 ...
+        reversed_positions = (-positions) % dim
+        return(np.where(reverse, rotated[:, reversed_positions], rotated))
+
+    def evaluate(self, individuals):
+        '''
+        Return
+        ------
+        - the fitness of the individuals as a numpy ndarray of
+            dimension (nb_individuals, ), only the individuals not found
+            in the cache being evaluated (at once)
+        '''
+        keys = self.get_keys(individuals)
+        fitness = np.empty(len(keys))
+        missing = {}
+        for idx, key in enumerate(keys):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                fitness[idx] = self.cache[key]
+                self.hits = self.hits + 1
+            else:
+                missing.setdefault(key, []).append(idx)
+
+        if missing:
+            # evaluate every missing individual once
+            first_idxs = [idxs[0] for idxs in missing.values()]
+            missing_fitness = self.fitness_func(individuals[first_idxs])
+            self.misses = self.misses + len(first_idxs)
+            for (key, idxs), value in zip(missing.items(), missing_fitness):
+                fitness[idxs] = value
+                self.hits = self.hits + len(idxs) - 1
+                self.cache[key] = value
+                self.memory = self.memory + len(key) + self.ENTRY_OVERHEAD
+
+            # evict the least recently used fitness values
+            while self.memory > self.max_memory and self.cache:
+                key, _ = self.cache.popitem(last=False)
+                self.memory = self.memory - len(key) - self.ENTRY_OVERHEAD
+
+        return(fitness)
+
+    def __call__(self, individuals):
+        return(self.evaluate(individuals))
+
+    def clear(self):
+        self.cache.clear()
+        self.memory = 0
@@ -1,3 +1,7 @@
+import os
+import time
+import pickle
+
 import numpy as np
 
 
@@ -5,6 +9,63 @@ from ga_operators import Selection_Tournament
 from ga_operators import Crossover_Ordered
 from ga_operators import Mutation_Swap, Mutation_Inversion
 from ga_operators import Mutation_Scramble
+from ga_operators import Mutation_Circular_Inversion
+from ga_operators import Mutation_Circular_Scramble
+from ga_operators import Local_Search_2Opt
+from ga_numba import get_backend
+from population import Population
+from history import List_History
+
+
+# stages of a generation, whose wall-clock times are recorded
+# in GA.timings (columns, in this order)
+STAGES = ("selection", "crossover", "evaluation", "mutation",
+          "local_search", "elitism", "replacement")
+SELECTION, CROSSOVER, EVALUATION, MUTATION, LOCAL_SEARCH, ELITISM, \
+    REPLACEMENT = range(len(STAGES))
+
+
+def lap_time(timings, stage, start):
+    '''
+    Add the time elapsed since start to the timings of a stage
+    Return
+    ------
+    - the current time, i.e. the start of the next stage
+    '''
+    now = time.perf_counter()
+    timings[stage] = timings[stage] + now - start
+    return(now)
+
+
+def sync_file(file):
+    '''
+    Write an open file to disk, i.e. flush the Python buffers then the
+    ones of the OS, so that it can be safely renamed
+    '''
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def load_checkpoint_logs(path, offset):
+    '''
+    Read back the logs of a List_History saved with the checkpoints
+    (see GA.save_history)
+    Parameters
+    ----------
+    - path: the history file of the checkpoint
+    - offset: the length of the file at the time of the checkpoint
+        (anything written after is ignored)
+    Return
+    ------
+    - the list of the logs
+    '''
+    logs = []
+    if offset == 0:
+        return(logs)
+    with open(path, "rb") as file:
+        while file.tell() < offset:
+            logs.extend(pickle.load(file))
+    return(logs)
 
 
 class GA:
@@ -24,7 +85,19 @@ class GA:
                                    "sequence_max_width": 15},
                  mutation_op="scramble",
                  mutation_params={"mutation_proba": 0.1,
-                                  "sequence_max_width": 5}):
+                                  "sequence_max_width": 5},
+                 delta_evaluation=True,
+                 evaluator=None,
+                 evaluator_params={},
+                 local_search_op=None,
+                 local_search_params={"apply_to": "offsprings",
+                                      "local_search_proba": 1},
+                 backend=None,
+                 seed=None,
+                 stagnation_params={},
+                 on_generation_start=None,
+                 on_generation_end=None,
+                 checkpoint_params={}):
         '''
         Parameters
         ----------
@@ -40,16 +113,106 @@ class GA:
         - crossover_params: a dictionary of parameters for the selected
             crossover operator
         - the mutation operator for mutating offspring. One of:
-            ("swap", "inversion", "scramble")
+            ("swap", "inversion", "scramble", "circular_inversion",
+             "circular_scramble")
         - mutation_params: a dictionary of parameters for the selected
             mutation operator
+        - delta_evaluation: if True and the problem provides a
+            fitness_delta method (e.g. TSP_Problem), offsprings are
+            evaluated after crossover and the fitness of the mutated
+            ones is updated with the delta of the mutation only.
+            In any case, the fitness of the elites and of the
+            offsprings identical to their parents is carried over
+            and only the changed individuals are evaluated
+        - evaluator: if not None, the evaluator to use for the
+            population's fitness. One of: ("serial", "process")
+        - evaluator_params: a dictionary of parameters for the selected
+            evaluator (e.g. nb_workers, min_parallel_size)
+        - the local search operator for improving offsprings or elites
+            (memetic algorithm). One of:
+            (None, "2opt")
+        - local_search_params: a dictionary of parameters for the selected
+            local search operator
+        - backend: the implementation of the crossover and mutation
+            kernels and of the problem's fitness (if the problem has a
+            set_backend method, e.g. TSP_Problem). One of:
+            (None, "numpy", "numba"). "numba" runs compiled parallel
+            loops and falls back to "numpy" if numba is not installed.
+            None (default) keeps the problem's backend (if any, else
+            "numpy") and uses it for the operators too. With a
+            "process" evaluator created before the GA, the backend of
+            the problem is the one it had when the evaluator was created
+        - seed: the seed of the GA (None, an int or a numpy
+            SeedSequence). Independent random generators are spawned
+            from it for the selection, crossover, mutation and local
+            search operators, so that two runs with the same seed (and
+            populations with the same seed) are identical
+        - stagnation_params: a dictionary of the (optional) convergence
+            criteria of the population, checked before every generation:
+            - max_stagnation: the number of generations without
+                improvement of the best fitness
+            - ftol: the tolerance on the fitness range of the population,
+                i.e. max(fitness) - min(fitness) <= ftol
+            - min_diversity: the threshold of the diversity of the
+                population (see Population.get_diversity)
+            - action: what to do when a criterion is met. One of:
+                ("stop", "restart"), default "stop".
+                restart: the nb_kept best individuals are kept and the
+                others are replaced by new random individuals
+            - nb_kept: the number of individuals kept by a restart,
+                default the number of elites (at least 1)
+        - on_generation_start, on_generation_end: optional functions
+            called with the GA instance before and after every
+            generation (e.g. to monitor self.timings)
+        - checkpoint_params: a dictionary of the (optional) parameters of
+            the periodic checkpoints of run(), see save_checkpoint:
+            - path: the checkpoint file, default None (no checkpoint)
+            - interval: the number of generations between two
+                checkpoints, default 10
         '''
 
         # NO VALIDATION on parameters for now ...
 
+        # parameters of the GA, saved with the checkpoints (but the
+        # callbacks and evaluator objects)
+        self.params = {"nb_generation": nb_generation,
+                       "elite_ratio": elite_ratio,
+                       "selection_op": selection_op,
+                       "selection_params": selection_params,
+                       "crossover_op": crossover_op,
+                       "crossover_params": crossover_params,
+                       "mutation_op": mutation_op,
+                       "mutation_params": mutation_params,
+                       "delta_evaluation": delta_evaluation,
+                       "local_search_op": local_search_op,
+                       "local_search_params": local_search_params,
+                       "backend": backend,
+                       "seed": seed,
+                       "stagnation_params": stagnation_params,
+                       "checkpoint_params": checkpoint_params}
+        if evaluator is None or isinstance(evaluator, str):
+            self.params["evaluator"] = evaluator
+            self.params["evaluator_params"] = evaluator_params
+
         # population
         self.population = population
 
+        # Backend of the operators and of the problem's fitness (set
+        # before a new evaluator sends the problem to its workers), the
+        # problem's one being kept if none is given
+        if backend is None:
+            self.backend = get_backend(
+                getattr(self.population.problem, "backend", "numpy"))
+        else:
+            self.backend = get_backend(backend)
+            if hasattr(self.population.problem, "set_backend"):
+                self.population.problem.set_backend(self.backend)
+        crossover_params = {"backend": self.backend, **crossover_params}
+        mutation_params = {"backend": self.backend, **mutation_params}
+
+        if evaluator is not None:
+            self.population.set_evaluator(evaluator, evaluator_params)
+
         # Number of generation (default to 100)
         self.nb_generation = nb_generation
 
@@ -61,65 +224,530 @@ class GA:
         # at each generation -> population size - Elites
         self.nb_offsprings = self.population.size - self.nb_elites
 
+        # Random generators of the operators
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        selection_rng, crossover_rng, mutation_rng, local_search_rng = \
+            (np.random.default_rng(seed_sequence)
+             for seed_sequence in self.seed_sequence.spawn(4))
+
         # Selection operators
         if selection_op == "tournament":
-            self.selection_op = Selection_Tournament(selection_params)
+            self.selection_op = Selection_Tournament(selection_params,
+                                                     selection_rng)
         else:
             raise NotImplementedError
 
         # Crossover operators
         if crossover_op == "ordered":
-            self.crossover_op = Crossover_Ordered(crossover_params)
+            self.crossover_op = Crossover_Ordered(crossover_params,
+                                                  crossover_rng)
         else:
             raise NotImplementedError
 
         # Mutation operators
         if mutation_op == "swap":
-            self.mutation_op = Mutation_Swap(mutation_params)
+            self.mutation_op = Mutation_Swap(mutation_params, mutation_rng)
         elif mutation_op == "inversion":
-            self.mutation_op = Mutation_Inversion(mutation_params)
+            self.mutation_op = Mutation_Inversion(mutation_params,
+                                                  mutation_rng)
         elif mutation_op == "scramble":
-            self.mutation_op = Mutation_Scramble(mutation_params)
+            self.mutation_op = Mutation_Scramble(mutation_params,
+                                                 mutation_rng)
+        elif mutation_op == "circular_inversion":
+            self.mutation_op = Mutation_Circular_Inversion(mutation_params,
+                                                           mutation_rng)
+        elif mutation_op == "circular_scramble":
+            self.mutation_op = Mutation_Circular_Scramble(mutation_params,
+                                                          mutation_rng)
+        else:
+            raise NotImplementedError
+
+        # Local search operators
+        if local_search_op is None:
+            self.local_search_op = None
+        elif local_search_op == "2opt":
+            self.local_search_op = Local_Search_2Opt(local_search_params,
+                                                     self.population.problem,
+                                                     local_search_rng)
         else:
             raise NotImplementedError
 
-    def run(self):
+        # Delta evaluation of mutations
+        self.delta_evaluation = delta_evaluation and \
+            hasattr(self.population.problem, "fitness_delta")
+
+        # Convergence criteria
+        self.max_stagnation = stagnation_params.get("max_stagnation", None)
+        self.ftol = stagnation_params.get("ftol", None)
+        self.min_diversity = stagnation_params.get("min_diversity", None)
+        self.stagnation_action = stagnation_params.get("action", "stop")
+        if self.stagnation_action not in ("stop", "restart"):
+            raise NotImplementedError
+        self.nb_kept = stagnation_params.get("nb_kept",
+                                             max(self.nb_elites, 1))
+        self.nb_restarts = 0
+
+        # best fitness so far and the generation it was found
+        self.stagnation_best_fitness = np.inf
+        self.stagnation_generation = self.population.generation
+
+        # why the last run() stopped
+        self.stop_reason = None
+
+        # Profiling: wall-clock time of every stage (see STAGES) and
+        # number of evaluations of every generation of the last run()
+        self.on_generation_start = on_generation_start
+        self.on_generation_end = on_generation_end
+        self.timings = np.zeros((0, len(STAGES)))
+        self.evaluations = np.zeros(0, dtype=np.int64)
+
+        # Checkpoints, and the number of generations already done by
+        # the current run (when resumed from a checkpoint)
+        self.checkpoint_path = checkpoint_params.get("path", None)
+        self.checkpoint_interval = checkpoint_params.get("interval", 10)
+        self.run_generation = 0
+        # what has already been saved with the checkpoints: the
+        # checkpoint file the problem was pickled for, and (checkpoint
+        # file, length of its history file, number of logs saved)
+        self.problem_checkpoint = None
+        self.history_checkpoint = None
+
+    def run(self, max_time=None, max_evaluations=None, target_fitness=None):
         '''
         Do the thing !
+        Each generation is written in place in the buffers of the
+        population (parents, offsprings), which are swapped with the
+        current generation once complete.
+        run() can be called again to continue the evolution of the
+        population for another nb_generation generations.
+        The run stops after nb_generation generations or as soon as one
+        of the (optional) budgets below is reached, checked before every
+        generation. The reason is kept as self.stop_reason, one of:
+        ("target_fitness", "max_evaluations", "max_time", "nb_generation")
+        or, if the population has converged (see stagnation_params), one
+        of ("max_stagnation", "ftol", "min_diversity") unless the
+        population is restarted instead.
+        Parameters
+        ----------
+        - max_time: the wall-clock time budget of the run, in seconds
+        - max_evaluations: the maximum number of fitness evaluations of
+            the population (in total, i.e. since its creation). As a
+            generation is never interrupted, it can be exceeded by the
+            evaluations of the last generation
+        - target_fitness: stop when the best fitness is lower than or
+            equal to this value
+        The wall-clock time of every stage of every generation is kept
+        as self.timings, a (nb_generation, len(STAGES)) array, and the
+        number of evaluations of every generation as self.evaluations
+        (see get_timings).
+        If a checkpoint path is set, the state of the run is saved every
+        checkpoint interval generations. A GA resumed from a checkpoint
+        (see resume) goes on with the interrupted run: the budgets are
+        not saved and have to be given again.
         '''
-        # get fitness of initial population
-        self.population.get_fitness(self.population.individuals)
+        population = self.population
+        if max_time is not None:
+            deadline = time.perf_counter() + max_time
+        else:
+            deadline = None
+
+        # get fitness of initial population (if not already done)
+        if population.generation == 0:
+            population.get_fitness(population.individuals)
+
+        # preallocated profiling arrays (the run cannot be longer
+        # than nb_generation)
+        self.timings = np.zeros((self.nb_generation, len(STAGES)))
+        self.evaluations = np.zeros(self.nb_generation, dtype=np.int64)
+
+        # loop for all generation, until a budget is reached
+        generation = self.run_generation
+        self.run_generation = 0
+        self.stop_reason = self.check_stop(generation, deadline,
+                                           max_evaluations, target_fitness)
+        while self.stop_reason is None:
+            if self.on_generation_start is not None:
+                self.on_generation_start(self)
+            timings = self.timings[generation]
+            nb_evaluations = population.nb_evaluations
+            start = time.perf_counter()
 
-        # loop for all generation
-        for _ in range(self.nb_generation):
             # Select parents according to the chosen selection operator
             # Same population size is generated (i.e. there could/ there
             # will be duplicated parents)
-            parents = self.selection_op.select(self.population)
+            parents = self.selection_op.select(population,
+                                               out=population.parents)
+            start = lap_time(timings, SELECTION, start)
 
             # Generate offsprings through crossover
             # using the chosen crossover operator
             # The number of offsprings to generate depends on
-            # the number of elites to keep for the next generation
-            offsprings = self.crossover_op.crossover(parents,
-                                                     self.nb_offsprings)
+            # the number of elites to keep for the next generation.
+            # The elites are stored first in the next generation,
+            # followed by the offsprings
+            offsprings = population.offsprings[self.nb_elites:]
+            self.crossover_op.crossover(parents, self.nb_offsprings,
+                                        out=offsprings)
+            start = lap_time(timings, CROSSOVER, start)
+
+            # The fitness of the offsprings is carried along: offsprings
+            # that are copies of their parents (no crossover) have their
+            # parents' fitness, only the crossed ones need evaluation
+            fitness = population.offsprings_fitness[self.nb_elites:]
+            np.take(population.fitness,
+                    self.selection_op.selection_idxs[
+                        self.crossover_op.parents_idxs],
+                    out=fitness, mode="clip")
+            crossed = self.crossover_op.crossed
+
+            # With delta evaluation, the crossed offsprings are evaluated
+            # before mutation
+            if self.delta_evaluation:
+                self.evaluate(offsprings, fitness, crossed)
+            start = lap_time(timings, EVALUATION, start)
 
-            # mutate offsprings using the chosen
+            # mutate offsprings (inplace) using the chosen
             # mutation operator
-            offsprings = self.mutation_op.mutate(offsprings)
+            self.mutation_op.mutate(offsprings)
+            mutated_idxs = self.mutation_op.mutated_idxs
+            start = lap_time(timings, MUTATION, start)
+
+            # and the fitness of the mutated ones is updated using
+            # only the genes changed by the mutation
+            if self.delta_evaluation:
+                fitness[mutated_idxs] = fitness[mutated_idxs] + \
+                    population.problem.fitness_delta(
+                        offsprings, mutated_idxs,
+                        self.mutation_op.mutated_positions,
+                        self.mutation_op.mutated_genes)
+            # else the crossed or mutated offsprings are evaluated
+            else:
+                changed = crossed.copy()
+                changed[mutated_idxs] = True
+                self.evaluate(offsprings, fitness, changed)
+            start = lap_time(timings, EVALUATION, start)
+
+            # improve the offsprings with local search
+            # (the fitness being updated with the gains)
+            if self.local_search_op is not None and \
+               self.local_search_op.apply_to == "offsprings":
+                self.local_search_op.improve(offsprings, fitness)
+            start = lap_time(timings, LOCAL_SEARCH, start)
 
             # Create Elites if we need to
             # Elites are the best individuals of the current
             # generation, i.e. the ones with the best fitness
             if self.nb_elites > 0:
                 elites_idxs = \
-                    np.argsort(self.population.fitness)[:self.nb_elites]
-                elites = np.copy(self.population.individuals[elites_idxs])
+                    np.argsort(population.fitness)[:self.nb_elites]
+                np.take(population.individuals, elites_idxs, axis=0,
+                        out=population.offsprings[:self.nb_elites],
+                        mode="clip")
+
+                # Elites fitness is already known
+                np.take(population.fitness, elites_idxs,
+                        out=population.offsprings_fitness[:self.nb_elites])
+                start = lap_time(timings, ELITISM, start)
 
-                # Concatenate offsprings and elites to finally get a
-                # full population matrix (population_size, dimension)
-                offsprings = np.concatenate((elites, offsprings), axis=0)
+                # improve the elites with local search
+                if self.local_search_op is not None and \
+                   self.local_search_op.apply_to == "elites":
+                    self.local_search_op.improve(
+                        population.offsprings[:self.nb_elites],
+                        population.offsprings_fitness[:self.nb_elites])
+                    start = lap_time(timings, LOCAL_SEARCH, start)
 
             # update the population (solutions) and
-            # fitness values
-            self.population.get_fitness(offsprings)
+            # fitness values, i.e. swap the current and next generations
+            population.get_fitness(population.offsprings,
+                                   population.offsprings_fitness)
+            lap_time(timings, REPLACEMENT, start)
+            self.evaluations[generation] = \
+                population.nb_evaluations - nb_evaluations
+
+            if self.on_generation_end is not None:
+                self.on_generation_end(self)
+            generation = generation + 1
+
+            if self.checkpoint_path is not None and \
+               generation % self.checkpoint_interval == 0:
+                self.save_checkpoint(self.checkpoint_path, generation)
+            self.stop_reason = self.check_stop(generation, deadline,
+                                               max_evaluations,
+                                               target_fitness)
+
+        # keep the profiling of the generations done only
+        self.timings = self.timings[:generation]
+        self.evaluations = self.evaluations[:generation]
+
+    def get_timings(self):
+        '''
+        Return
+        ------
+        - the profiling of the last run() as a dictionary of arrays of
+            dimension (nb_generation_done, ): the wall-clock time of
+            every stage (see STAGES) and the number of evaluations
+        '''
+        timings = {stage: self.timings[:, i]
+                   for i, stage in enumerate(STAGES)}
+        timings["evaluations"] = self.evaluations
+        return(timings)
+
+    def save_checkpoint(self, path, run_generation=0):
+        '''
+        Save the state of the GA and of its population in a npz file,
+        written atomically (temporary file written to disk, then
+        renamed), from which the evolution can be resumed exactly (see
+        resume): the individuals and their fitness, the generation, the
+        best individual, the counters, the states of all the random
+        generators, the history and the parameters of the GA.
+        As they only grow or do not change, two files are kept beside:
+        - <path>.problem: the pickled problem, written by the first
+            checkpoint only (nothing if it cannot be pickled)
+        - <path>.history: the logs of a List_History, only the ones
+            since the last checkpoint being appended (see
+            save_history). A Ring_History, of fixed size, is saved
+            with the state
+        The fitness cache (if any) is saved empty.
+        Parameters
+        ----------
+        - path: the checkpoint file
+        - run_generation: the number of generations already done by
+            the current run
+        '''
+        population = self.population
+        if self.problem_checkpoint != path:
+            try:
+                problem = pickle.dumps(population.problem)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                problem = None
+            if problem is not None:
+                temporary_path = path + ".problem.tmp"
+                with open(temporary_path, "wb") as file:
+                    file.write(problem)
+                    sync_file(file)
+                os.replace(temporary_path, path + ".problem")
+            self.problem_checkpoint = path
+
+        history = population.history
+        history_offset = 0
+        if isinstance(history, List_History):
+            history_offset = self.save_history(path, history.logs)
+            history = None
+
+        fitness_cache = population.fitness_cache
+        if fitness_cache is not None:
+            fitness_cache = {"key": fitness_cache.key,
+                             "quantum": fitness_cache.quantum,
+                             "max_memory": fitness_cache.max_memory}
+
+        state = {"params": self.params,
+                 "population_size": population.size,
+                 "fitness_cache": fitness_cache,
+                 "generation": population.generation,
+                 "best_fitness": population.best_fitness,
+                 "nb_evaluations": population.nb_evaluations,
+                 "nb_evaluations_logged": population.nb_evaluations_logged,
+                 "history": history,
+                 "history_offset": history_offset,
+                 "population_rng": population.rng.bit_generator.state,
+                 "operators_rng": [op.rng.bit_generator.state
+                                   for op in self.get_operators()],
+                 "run_generation": run_generation,
+                 "nb_restarts": self.nb_restarts,
+                 "stagnation_best_fitness": self.stagnation_best_fitness,
+                 "stagnation_generation": self.stagnation_generation}
+        state = np.frombuffer(pickle.dumps(state), dtype=np.uint8)
+
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(file, individuals=population.individuals,
+                     fitness=population.fitness,
+                     best_individual=np.asarray(population.best_individual),
+                     state=state)
+            sync_file(file)
+        os.replace(temporary_path, path)
+
+    def save_history(self, path, logs):
+        '''
+        Append the logs not saved yet by the previous checkpoint to the
+        history file of the checkpoint, <path>.history (a sequence of
+        pickled lists of logs).
+        The file is first cut to its length at the previous checkpoint,
+        so that what a checkpoint interrupted before its rename wrote
+        is discarded. The new length is recorded in the checkpoint.
+        Parameters
+        ----------
+        - path: the checkpoint file
+        - logs: all the logs of the history
+        Return
+        ------
+        - the length of the history file
+        '''
+        offset, nb_logs = 0, 0
+        if self.history_checkpoint is not None and \
+           self.history_checkpoint[0] == path:
+            _, offset, nb_logs = self.history_checkpoint
+        with open(path + ".history", "r+b" if offset > 0 else "wb") as file:
+            file.seek(offset)
+            file.truncate()
+            pickle.dump(logs[nb_logs:], file)
+            sync_file(file)
+            offset = file.tell()
+        self.history_checkpoint = (path, offset, len(logs))
+        return(offset)
+
+    @classmethod
+    def resume(cls, path, problem=None, **ga_params):
+        '''
+        Rebuild a GA and its population from a checkpoint (see
+        save_checkpoint). Its run() goes on with the interrupted run,
+        exactly as if it had not been interrupted.
+        Parameters
+        ----------
+        - path: the checkpoint file
+        - problem (optional): the problem, required if it could not be
+            pickled with the checkpoint (no <path>.problem file)
+        - ga_params: parameters of the GA overriding the saved ones
+            (e.g. the callbacks or the evaluator)
+        Return
+        ------
+        - the GA, whose population is self.population
+        '''
+        with np.load(path) as checkpoint:
+            individuals = checkpoint["individuals"]
+            fitness = checkpoint["fitness"]
+            best_individual = checkpoint["best_individual"]
+            state = pickle.loads(checkpoint["state"].tobytes())
+        if problem is None:
+            if not os.path.exists(path + ".problem"):
+                raise ValueError("the problem was not saved with the "
+                                 "checkpoint, it must be given")
+            with open(path + ".problem", "rb") as file:
+                problem = pickle.load(file)
+
+        history = state["history"]
+        if history is None:
+            history = List_History()
+            history.logs = load_checkpoint_logs(path + ".history",
+                                                state["history_offset"])
+
+        population = Population(problem, state["population_size"],
+                                fitness_cache=state["fitness_cache"],
+                                history=history)
+        population.individuals[...] = individuals
+        population.fitness[...] = fitness
+        population.generation = state["generation"]
+        population.best_fitness = state["best_fitness"]
+        population.best_individual = best_individual
+        population.nb_evaluations = state["nb_evaluations"]
+        population.nb_evaluations_logged = state["nb_evaluations_logged"]
+        population.rng.bit_generator.state = state["population_rng"]
+
+        ga = cls(population, **dict(state["params"], **ga_params))
+        for op, rng_state in zip(ga.get_operators(), state["operators_rng"]):
+            op.rng.bit_generator.state = rng_state
+        ga.run_generation = state["run_generation"]
+        ga.nb_restarts = state["nb_restarts"]
+        ga.stagnation_best_fitness = state["stagnation_best_fitness"]
+        ga.stagnation_generation = state["stagnation_generation"]
+        # carry on the checkpoints' files
+        if os.path.exists(path + ".problem"):
+            ga.problem_checkpoint = path
+        if state["history"] is None:
+            ga.history_checkpoint = (path, state["history_offset"],
+                                     len(history.logs))
+        return(ga)
+
+    def get_operators(self):
+        '''
+        Return
+        ------
+        - the list of the operators of the GA
+        '''
+        operators = [self.selection_op, self.crossover_op, self.mutation_op]
+        if self.local_search_op is not None:
+            operators.append(self.local_search_op)
+        return(operators)
+
+    def check_stop(self, generation, deadline, max_evaluations,
+                   target_fitness):
+        '''
+        Check the stopping criteria of run() (see get_stop_reason), and
+        restart the population instead of stopping if it has converged
+        and the stagnation action is "restart"
+        Return
+        ------
+        - None if the run goes on, else the reason to stop
+        '''
+        stop_reason = self.get_stop_reason(generation, deadline,
+                                           max_evaluations, target_fitness)
+        if stop_reason in ("max_stagnation", "ftol", "min_diversity") and \
+           self.stagnation_action == "restart":
+            self.population.restart(self.nb_kept)
+            self.nb_restarts = self.nb_restarts + 1
+            self.stagnation_generation = self.population.generation
+            stop_reason = None
+        return(stop_reason)
+
+    def get_stop_reason(self, generation, deadline, max_evaluations,
+                        target_fitness):
+        '''
+        Check the stopping criteria of run()
+        Parameters
+        ----------
+        - the number of generations done by the current run
+        - the perf_counter deadline of the run (or None)
+        - the maximum number of evaluations (or None)
+        - the target fitness (or None)
+        Return
+        ------
+        - None if the run goes on, else the reason to stop
+        '''
+        if target_fitness is not None and \
+           self.population.best_fitness <= target_fitness:
+            return("target_fitness")
+        if max_evaluations is not None and \
+           self.population.nb_evaluations >= max_evaluations:
+            return("max_evaluations")
+        if deadline is not None and time.perf_counter() >= deadline:
+            return("max_time")
+        if generation >= self.nb_generation:
+            return("nb_generation")
+
+        # convergence of the population
+        population = self.population
+        if population.best_fitness < self.stagnation_best_fitness:
+            self.stagnation_best_fitness = population.best_fitness
+            self.stagnation_generation = population.generation
+        if self.max_stagnation is not None and \
+           population.generation - self.stagnation_generation \
+           >= self.max_stagnation:
+            return("max_stagnation")
+        if self.ftol is not None and \
+           population.fitness.max() - population.fitness.min() <= self.ftol:
+            return("ftol")
+        if self.min_diversity is not None and \
+           population.get_diversity() < self.min_diversity:
+            return("min_diversity")
+        return(None)
+
+    def evaluate(self, individuals, fitness, idxs):
+        '''
+        Evaluate some of the individuals, updating their fitness inplace
+        Parameters
+        ----------
+        - the individuals as a numpy ndarray
+        - their fitness
+        - the individuals to evaluate (boolean mask)
+        The individuals to evaluate are gathered in the scratch buffer
+        of the population, rather than in a new array
+        '''
+        idxs = np.flatnonzero(idxs)
+        if idxs.shape[0] > 0:
+            selected = np.take(individuals, idxs, axis=0, mode="clip",
+                               out=self.population.scratch[:idxs.shape[0]])
+            fitness[idxs] = self.population.evaluate(selected)
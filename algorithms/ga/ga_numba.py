@@ -0,0 +1,119 @@
+import warnings
+
+import numpy as np
+
+
+# Numba is optional: without it, the kernels below are plain python
+# functions (correct but slow) and the "numba" backend falls back to
+# the numpy implementation of the operators
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return(func)
+        return(decorator)
+
+
+BACKENDS = ("numpy", "numba")
+
+
+def get_backend(backend):
+    '''
+    Check the backend of the operators and fall back to "numpy" if
+    "numba" is asked for but numba is not installed
+    Parameters
+    ----------
+    - backend: one of ("numpy", "numba")
+    Return
+    ------
+    - the backend to use
+    '''
+    if backend not in BACKENDS:
+        raise NotImplementedError
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        warnings.warn("numba is not installed, falling back to the "
+                      "numpy backend")
+        backend = "numpy"
+    return(backend)
+
+
+@njit(parallel=True, cache=True)
+def complete_sequences(parents, bases_idxs, donors_idxs, starts, widths,
+                       children):
+    '''
+    Ordered crossover of several children at once (see
+    Crossover_Ordered.complete_sequences): every child gets the
+    sequence [start, start + width[ of its donor and is completed with
+    the genes of its base, in the order they appear in the base
+    starting from the second crossover point.
+    Parameters
+    ----------
+    - parents: the parents, as a (nb_parents, dimension) array
+    - bases_idxs, donors_idxs: the indexes of the two parents of every
+        child
+    - starts, widths: the crossover points of every child (a child with
+        a null width is a copy of its base)
+    - children: the (nb_children, dimension) array in which to write
+        the children
+    '''
+    nb_children, dim = children.shape
+    for i in prange(nb_children):
+        base = parents[bases_idxs[i]]
+        donor = parents[donors_idxs[i]]
+        start = starts[i]
+        end = start + widths[i]
+
+        # copy the sequence of the donor and mark its genes
+        in_sequence = np.zeros(dim + 2, dtype=np.bool_)
+        for j in range(start, end):
+            children[i, j] = donor[j]
+            in_sequence[np.int64(donor[j])] = True
+
+        # complete the child from the second crossover point
+        position = end % dim
+        for k in range(dim):
+            gene = base[(end + k) % dim]
+            if not in_sequence[np.int64(gene)]:
+                children[i, position] = gene
+                position = (position + 1) % dim
+
+
+@njit(parallel=True, cache=True)
+def move_genes(offsprings, idxs, positions, sources):
+    '''
+    Move genes within some offsprings, in place: for every mutated
+    offspring idxs[i], the gene at position sources[i, k] goes to
+    position positions[i, k] (e.g. a swap, an inversion or a shuffle
+    of a sequence of genes).
+    Parameters
+    ----------
+    - offsprings: the (nb_offsprings, dimension) array to mutate
+    - idxs: the indexes of the mutated offsprings, of dimension (m, )
+    - positions: the positions of the genes to change, of dimension
+        (m, k). Unused positions are set to -1
+    - sources: the positions the new genes come from, of dimension
+        (m, k)
+    Return
+    ------
+    - genes: the genes at positions BEFORE the mutation (0 where the
+        position is unused), of dimension (m, k)
+    '''
+    nb_mutated, nb_positions = positions.shape
+    genes = np.zeros((nb_mutated, nb_positions), dtype=offsprings.dtype)
+    for i in prange(nb_mutated):
+        row = idxs[i]
+        # read all the genes (old and new) before writing any of them
+        moved = np.zeros(nb_positions, dtype=offsprings.dtype)
+        for k in range(nb_positions):
+            if positions[i, k] >= 0:
+                genes[i, k] = offsprings[row, positions[i, k]]
+                moved[k] = offsprings[row, sources[i, k]]
+        for k in range(nb_positions):
+            if positions[i, k] >= 0:
+                offsprings[row, positions[i, k]] = moved[k]
+    return(genes)
@@ -1,5 +1,124 @@
 import numpy as np
 
+import ga_numba
+
+
+def get_buffer(buffers, name, shape, dtype):
+    '''
+    Get a scratch array of an operator, allocated on the first call (or
+    when its shape or dtype changes) and then reused from a generation
+    to the next
+    Parameters
+    ----------
+    - buffers: the dictionary of the scratch arrays of the operator
+    - name: the name of the array
+    - shape, dtype: the shape and dtype of the array
+    Return
+    ------
+    - the array (its content is undefined)
+    '''
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = np.empty(shape, dtype=dtype)
+        buffers[name] = buffer
+    return(buffer)
+
+
+def sample_sequences(rng, size, dim, max_width):
+    '''
+    Draw (uniform random) sequences of genes [start, start + width[
+    with a width within [2, max_width], as the rejection loops of the
+    operators do, i.e. every valid (start, end) pair with end <= dim - 1
+    is equally likely. The width is drawn directly, with a probability
+    proportional to its number of valid starts (dim - width).
+    Parameters
+    ----------
+    - rng: the numpy random Generator to use
+    - size: the number of sequences to draw
+    - dim: the dimension of the individuals
+    - max_width: the maximum width of a sequence
+    Return
+    ------
+    - starts, widths: two numpy arrays of dimension (size, )
+    '''
+    widths = np.arange(2, min(max_width, dim - 1) + 1)
+    weights = (dim - widths) / (dim - widths).sum()
+    widths = rng.choice(widths, size=size, p=weights)
+    starts = np.floor(rng.uniform(size=size) * (dim - widths)).astype(np.int64)
+    return(starts, widths)
+
+
+def sample_circular_sequences(rng, size, dim, max_width):
+    '''
+    Draw (uniform random) sequences of genes of a circular array, i.e.
+    the sequence [start, start + width[ can wrap around the end of the
+    array (e.g. 8.9.0.1), with a width within [2, max_width]
+    Parameters
+    ----------
+    - rng: the numpy random Generator to use
+    - size: the number of sequences to draw
+    - dim: the dimension of the individuals
+    - max_width: the maximum width of a sequence
+    Return
+    ------
+    - starts, widths: two numpy arrays of dimension (size, )
+    '''
+    widths = rng.integers(2, min(max_width, dim - 1) + 1, size=size)
+    starts = rng.integers(dim, size=size)
+    return(starts, widths)
+
+
+def get_sequences_positions(starts, widths, max_width, dim):
+    '''
+    Build the positions of the genes of sequences of different widths
+    as a single (nb_sequences, max_width) array. Positions wrap around
+    the end of the individuals (circular sequences).
+    Parameters
+    ----------
+    - starts, widths: the sequences, as returned by sample_sequences
+    - max_width: the maximum width of a sequence
+    - dim: the dimension of the individuals
+    Return
+    ------
+    - positions: the positions of the genes of every sequence, unused
+        positions (beyond the width of the sequence) being set to -1
+    - valid: the mask of the used positions
+    '''
+    offsets = np.arange(max_width)
+    valid = offsets < widths[:, np.newaxis]
+    positions = np.where(valid, (starts[:, np.newaxis] + offsets) % dim, -1)
+    return(positions, valid)
+
+
+def move_sequences_genes(offsprings, idxs, positions, sources, valid,
+                         backend="numpy"):
+    '''
+    Move the genes of sequences within some offsprings, in place: the
+    gene at position sources[i, k] of offspring idxs[i] goes to
+    position positions[i, k]
+    Parameters
+    ----------
+    - offsprings: the (nb_offsprings, dimension) array to mutate
+    - idxs: the indexes of the mutated offsprings, of dimension (m, )
+    - positions, valid: the positions of the genes of the sequences,
+        as returned by get_sequences_positions
+    - sources: the positions the new genes come from
+    - backend: one of ("numpy", "numba")
+    Return
+    ------
+    - genes: the genes at positions BEFORE the move (0 where the
+        position is unused), of dimension (m, max_width)
+    '''
+    if backend == "numba":
+        return(ga_numba.move_genes(offsprings, idxs, positions, sources))
+
+    rows = idxs[:, np.newaxis]
+    genes = np.where(valid, offsprings[rows, np.maximum(positions, 0)], 0)
+    rows, _ = np.broadcast_arrays(rows, positions)
+    offsprings[rows[valid], positions[valid]] = \
+        offsprings[rows[valid], sources[valid]]
+    return(genes.astype(offsprings.dtype, copy=False))
+
 
 # -------------------
 # SELECTION OPERATORS
@@ -41,8 +160,13 @@ class Selection_Tournament:
     1. Random uniform select of K individuals
     2. Select the fittest of these K individuals
     3. Repeat 1., 2. until the reach the desired number of individuals
+    In batched mode, the K individuals of all the tournaments are drawn
+    at once, as a (population_size, K) matrix of indexes, and the winners
+    are found with a single argmin along the tournaments axis.
+    The indexes of the selected individuals are kept as
+    self.selection_idxs.
     '''
-    def __init__(self, selection_params):
+    def __init__(self, selection_params, rng=None):
         '''
         Parameters
         ----------
@@ -51,25 +175,41 @@ class Selection_Tournament:
             per tournament. The higher K, the more probability the best
             individuals will be selected (-> loss of diversity).
             A recommended value is 2.
+        - batched (optional, default True): run all the tournaments at
+            once
+        - replace (optional, default False): in batched mode, whether an
+            individual can be drawn more than once within a tournament
+        - rng (optional): the seed or numpy random Generator of the
+            operator, drawn from for all its calls
         '''
         self.K = selection_params["K"]
+        self.batched = selection_params.get("batched", True)
+        self.replace = selection_params.get("replace", False)
+        self.rng = np.random.default_rng(rng)
+        # scratch arrays of the batched selection (see get_buffer)
+        self.buffers = {}
 
-    def select(self, population):
+    def select(self, population, out=None):
         '''
         Parameters
         ----------
         - The current population instance
+        - out (optional): a (population_size, dimension) array in which
+            to write the selected individuals
         Return
         ------
         - a numpy array, selection of individuals to serve for reproduction
             (crossover)
         '''
+        if self.batched:
+            return(self.select_batch(population, out))
+
         selection_idxs = []
         for _ in range(population.size):
             # Select K individuals by index
-            idxs = np.random.choice(range(population.size),
-                                    size=self.K,
-                                    replace=False)
+            idxs = self.rng.choice(population.size,
+                                   size=self.K,
+                                   replace=False)
 
             # Get the best individual (best fitness) by argsort-ing the
             # fitness vector (population.fitness)
@@ -78,7 +218,84 @@ class Selection_Tournament:
             selection_idxs.append(best_idx)
 
         # Return the selected individuals
-        return(population.individuals[np.array(selection_idxs)])
+        self.selection_idxs = np.array(selection_idxs)
+        return(np.take(population.individuals, self.selection_idxs,
+                       axis=0, out=out))
+
+    def select_batch(self, population, out=None):
+        '''
+        Run all the tournaments at once
+        Parameters
+        ----------
+        - The current population instance
+        - out (optional): a (population_size, dimension) array in which
+            to write the selected individuals
+        Return
+        ------
+        - a numpy array, selection of individuals to serve for reproduction
+            (crossover)
+        '''
+        rng = self.rng
+
+        size = population.size
+        idxs = get_buffer(self.buffers, "idxs", (size, self.K), np.int64)
+
+        # Select K individuals by index for every tournament
+        if self.replace:
+            idxs[...] = rng.integers(size, size=(size, self.K))
+        else:
+            if self.K > size:
+                raise ValueError("K cannot be larger than the population "
+                                 "size without replacement")
+            self.draw_tournaments(rng, size, idxs)
+
+        # Get the best individual (best fitness) of every tournament
+        # we are expecting minimisation problem
+        fitness = get_buffer(self.buffers, "fitness", (size, self.K),
+                             np.float64)
+        np.take(population.fitness, idxs, out=fitness, mode="clip")
+        winners = get_buffer(self.buffers, "winners", (size, ), np.intp)
+        np.argmin(fitness, axis=1, out=winners)
+        winners += np.arange(0, size * self.K, self.K)
+        selection_idxs = get_buffer(self.buffers, "selection_idxs",
+                                    (size, ), np.int64)
+        np.take(idxs, winners, out=selection_idxs, mode="clip")
+
+        # Return the selected individuals (mode="clip" as np.take
+        # buffers out otherwise, the indexes being valid anyway)
+        self.selection_idxs = selection_idxs
+        return(np.take(population.individuals, self.selection_idxs,
+                       axis=0, out=out, mode="clip"))
+
+    def draw_tournaments(self, rng, size, idxs):
+        '''
+        Draw the K distinct individuals of every tournament (without
+        replacement), in O(size * K^2):
+        the j-th individual of a tournament is drawn within the
+        size - j individuals not drawn yet, i.e. as an integer in
+        [0, size - j[ shifted past the (sorted) individuals already
+        drawn. When K^2 >= size, the K individuals are rather the K
+        smallest of size random keys, in O(size^2).
+        Parameters
+        ----------
+        - rng: the numpy random Generator to use
+        - size: the size of the population
+        - idxs: the (size, K) array in which to write the indexes of
+            the individuals
+        '''
+        if self.K**2 >= size:
+            keys = rng.random((size, size))
+            idxs[...] = np.argpartition(keys, self.K - 1,
+                                        axis=1)[:, :self.K]
+            return(idxs)
+
+        for j in range(self.K):
+            drawn = np.sort(idxs[:, :j], axis=1)
+            idx = rng.integers(size - j, size=size)
+            for k in range(j):
+                idx += idx >= drawn[:, k]
+            idxs[:, j] = idx
+        return(idxs)
 
 
 # -------------------
@@ -96,16 +313,34 @@ class Crossover_Ordered:
         sequence of genes to crossover
     4. Copy sequence from parent1 to child2 and parent2 to child1
     5. Complete child1 sequence with parent1, child2 with parent2
+    In batched mode, all the pairs of parents, dices and crossover
+    points are drawn at once and all the children are built together
+    into a preallocated (nb_offsprings, dimension) array.
+    Whether every offspring has been crossed (else it is a copy of its
+    parent) and the index of its (first) parent are kept as
+    self.crossed and self.parents_idxs.
     '''
-    def __init__(self, crossover_params):
+    def __init__(self, crossover_params, rng=None):
         '''
         - the crossover probability
         - the width of the sequence of genes to crossover
+        - batched (optional, default True): build all the offsprings at
+            once
+        - backend (optional, default "numpy"): how the batched crossover
+            builds the children, one of ("numpy", "numba")
+        - rng (optional): the seed or numpy random Generator of the
+            operator, drawn from for all its calls
         '''
         self.crossover_proba = crossover_params["crossover_proba"]
         self.max_width = crossover_params["sequence_max_width"]
+        self.batched = crossover_params.get("batched", True)
+        self.backend = ga_numba.get_backend(
+            crossover_params.get("backend", "numpy"))
+        self.rng = np.random.default_rng(rng)
+        # scratch arrays of the batched crossover (see get_buffer)
+        self.buffers = {}
 
-    def crossover(self, parents, nb_offsprings):
+    def crossover(self, parents, nb_offsprings, out=None):
         '''
         Perform the crossover
         Parameters
@@ -115,13 +350,20 @@ class Crossover_Ordered:
         - the number of offsprings to generate. That depends on the
             ratio of elite individuals that will be kept for next
             generation.
+        - out (optional): a (nb_offsprings, dimension) array in which to
+            write the offsprings
         Return
         ------
         - the offsprings as a numpy ndarray
         '''
-        rng = np.random.default_rng()
+        if self.batched:
+            return(self.crossover_batch(parents, nb_offsprings, out))
+
+        rng = self.rng
         parents_size = parents.shape[0]
         dim = parents.shape[1]
+        crossed = []
+        parents_idxs = []
         current_nb_offsprings = 0
         while current_nb_offsprings < nb_offsprings:
             # randomly (uniform) select two parents
@@ -134,7 +376,9 @@ class Crossover_Ordered:
             # Probability of performing crossover
             # if < self.crossover_proba perform cross over
             # for these 2 parents
-            if rng.uniform() < self.crossover_proba:
+            parents_idxs.extend(parents_idx)
+            crossed.extend(2*[rng.uniform() < self.crossover_proba])
+            if crossed[-1]:
 
                 # randomly (uniform) select two crossover points
                 # distant within [2, self.max_witdh]
@@ -145,9 +389,10 @@ class Crossover_Ordered:
                        ((seq[1] - seq[0]) > 1):
                         invalid_sequence = False
 
-                # initialise a child1, child2 array
-                child1 = -1*np.ones(dim, dtype=np.int32)
-                child2 = -1*np.ones(dim, dtype=np.int32)
+                # initialise a child1, child2 array (of the same
+                # dtype as the parents, e.g. uint8)
+                child1 = np.empty_like(parent1)
+                child2 = np.empty_like(parent2)
 
                 # copy the genes between crossover points
                 # from parents1 to child2 and parents2 to child1
@@ -179,16 +424,184 @@ class Crossover_Ordered:
         # reshape offsprings to a (self.nb_offsprings, dimension)
         # array
         offsprings = offsprings.reshape(-1, dim)
+        if out is not None:
+            out[...] = offsprings
+            offsprings = out
+
+        self.crossed = np.array(crossed[:nb_offsprings])
+        self.parents_idxs = np.array(parents_idxs[:nb_offsprings])
 
         return(offsprings)
 
+    def crossover_batch(self, parents, nb_offsprings, out=None):
+        '''
+        Perform the crossover for all the pairs of parents at once
+        Parameters
+        ----------
+        - all parents that have been selected for crossover
+            as numpy ndarray
+        - the number of offsprings to generate
+        - out (optional): a (nb_offsprings, dimension) array in which to
+            write the offsprings
+        Return
+        ------
+        - the offsprings as a numpy ndarray
+        '''
+        rng = self.rng
+        parents_size = parents.shape[0]
+        dim = parents.shape[1]
+        nb_pairs = (nb_offsprings + 1) // 2
+        if out is None:
+            out = np.empty((nb_offsprings, dim), dtype=parents.dtype)
+
+        # randomly (uniform) select two different parents for
+        # every pair
+        parents1_idxs = rng.integers(parents_size, size=nb_pairs)
+        parents2_idxs = rng.integers(parents_size - 1, size=nb_pairs)
+        parents2_idxs = parents2_idxs + (parents2_idxs >= parents1_idxs)
+
+        # child1 is built from parent1 with a sequence of parent2,
+        # child2 from parent2 with the same sequence of parent1.
+        # The children are stored as child1, child2, child1, child2 ...
+        # the last child2 being dropped if nb_offsprings is odd
+        bases_idxs = np.empty(2*nb_pairs, dtype=np.int64)
+        donors_idxs = np.empty(2*nb_pairs, dtype=np.int64)
+        bases_idxs[0::2] = donors_idxs[1::2] = parents1_idxs
+        bases_idxs[1::2] = donors_idxs[0::2] = parents2_idxs
+        bases_idxs = bases_idxs[:nb_offsprings]
+        donors_idxs = donors_idxs[:nb_offsprings]
+
+        # Probability of performing crossover for every pair
+        # and crossover points, shared by the two children of a pair.
+        # The children of non crossed pairs are built as children with
+        # an empty sequence, i.e. copies of their parents
+        crossed = np.repeat(rng.uniform(size=nb_pairs)
+                            < self.crossover_proba, 2)[:nb_offsprings]
+        starts, widths = sample_sequences(rng, nb_pairs, dim,
+                                          self.max_width)
+        starts = np.repeat(starts, 2)[:nb_offsprings]
+        widths = np.repeat(widths, 2)[:nb_offsprings] * crossed
+
+        if self.backend == "numba":
+            ga_numba.complete_sequences(parents, bases_idxs, donors_idxs,
+                                        starts, widths, out)
+        else:
+            self.complete_sequences(parents, bases_idxs, donors_idxs,
+                                    starts, widths, out)
+
+        self.crossed = crossed
+        self.parents_idxs = bases_idxs
+
+        return(out)
+
+    def complete_sequences(self, parents, bases_idxs, donors_idxs, starts,
+                           widths, out):
+        '''
+        Build children having the sequence [starts, starts + widths[ of
+        the donors and completed with the genes of the bases, in the order
+        they appear in the bases starting from the second crossover point
+        (i.e. complete_sequence for several children at once). Instead of
+        looking for every gene in the child, the position of every gene
+        in the donor is looked up in an inverse permutation.
+        All the (nb_children, dimension) intermediate arrays are scratch
+        buffers of the operator, reused from a generation to the next,
+        and the rows are addressed through flat indexes so that numpy
+        does not allocate any array of that size (np.take is called
+        with mode="clip" as it buffers its output otherwise, the
+        indexes being valid anyway).
+        Parameters
+        ----------
+        - parents: the parents, as a (nb_parents, dimension) array
+        - bases_idxs, donors_idxs: the indexes of the two parents of
+            every child
+        - starts, widths: the crossover points of every child (a child
+            with a null width is a copy of its base)
+        - out: the (nb_children, dimension) array in which to write the
+            children (C-contiguous)
+        '''
+        nb_children = bases_idxs.shape[0]
+        dim = parents.shape[1]
+        if nb_children == 0:
+            return(out)
+        shape = (nb_children, dim)
+
+        # genes are the integers [lbound, lbound + dim[, and the
+        # inverse permutations are indexed directly by the genes
+        lbound = int(parents[0].min())
+        nb_genes = lbound + dim
+        positions_dtype = np.min_scalar_type(dim)
+        positions = np.arange(dim, dtype=positions_dtype)
+        ends = (starts + widths)[:, np.newaxis]
+        starts = starts[:, np.newaxis]
+        rows = np.arange(nb_children)[:, np.newaxis]
+
+        buffers = self.buffers
+        donors = get_buffer(buffers, "donors", shape, parents.dtype)
+        np.take(parents, donors_idxs, axis=0, out=donors, mode="clip")
+        flat_idxs = get_buffer(buffers, "flat_idxs", shape, np.intp)
+        in_sequence = get_buffer(buffers, "in_sequence", shape, np.bool_)
+        mask = get_buffer(buffers, "mask", shape, np.bool_)
+
+        # position of every gene in the donors
+        donors_positions = get_buffer(buffers, "donors_positions",
+                                      (nb_children, nb_genes),
+                                      positions_dtype)
+        np.add(donors, rows * nb_genes, out=flat_idxs)
+        # (positions is repeated for every child)
+        np.put(donors_positions, flat_idxs, positions)
+
+        # genes of the bases read from the second crossover point
+        np.add(ends, positions, out=flat_idxs)
+        np.remainder(flat_idxs, dim, out=flat_idxs)
+        flat_idxs += bases_idxs[:, np.newaxis] * dim
+        genes = get_buffer(buffers, "genes", shape, parents.dtype)
+        np.take(parents, flat_idxs, out=genes, mode="clip")
+
+        # and whether they are part of the donor's sequence
+        np.add(genes, rows * nb_genes, out=flat_idxs)
+        genes_positions = get_buffer(buffers, "genes_positions", shape,
+                                     positions_dtype)
+        np.take(donors_positions, flat_idxs, out=genes_positions,
+                mode="clip")
+        np.greater_equal(genes_positions, starts, out=in_sequence)
+        np.less(genes_positions, ends, out=mask)
+        in_sequence &= mask
+
+        # the genes not in the sequence fill the child from the second
+        # crossover point (in order), the others are moved at the end,
+        # i.e. on the sequence positions. With c the number of genes of
+        # the sequence met so far, the rank of a gene is:
+        # - dim - width + c - 1 if in the sequence
+        # - its position - c otherwise
+        ranks = get_buffer(buffers, "ranks", shape, np.intp)
+        np.copyto(ranks, in_sequence)
+        np.cumsum(ranks, axis=1, out=ranks)
+        np.subtract(positions, ranks, out=flat_idxs)
+        ranks += (dim - 1 - widths)[:, np.newaxis]
+        np.copyto(flat_idxs, ranks, where=in_sequence)
+        flat_idxs += ends
+        np.remainder(flat_idxs, dim, out=flat_idxs)
+        flat_idxs += rows * dim
+        np.put(out, flat_idxs, genes)
+
+        # and the sequence is copied from the donors
+        np.greater_equal(positions, starts, out=in_sequence)
+        np.less(positions, ends, out=mask)
+        in_sequence &= mask
+        np.copyto(out, donors, where=in_sequence)
+
+        return(out)
+
     def complete_sequence(self, child, parent, cx_point, d):
         idx_child = idx_parent = cx_point[1]
+        # the parent being a permutation, a gene of the parent is
+        # already in the child only if it is part of the sequence
+        sequence = child[cx_point[0]:cx_point[1]]
         not_complete = True
         # complete upper range of the sequence first
         while not_complete:
             # for idx in range(cx_point[1], dim):
-            if parent[idx_parent] not in child:
+            if parent[idx_parent] not in sequence:
                 child[idx_child] = parent[idx_parent]
                 if idx_child == (d-1):
                     idx_child = 0
@@ -208,18 +621,80 @@ class Crossover_Ordered:
 # ------------------
 # MUTATION OPERATORS
 # ------------------
+class Mutation_Record:
+    '''
+    Keep track of the offsprings modified by a mutation operator,
+    i.e. for each mutated offspring:
+    - its index in the offsprings array
+    - the positions of the genes that have been changed
+    - the genes at these positions before the mutation
+    Positions and genes are stored as (nb_mutated, max_nb_positions)
+    arrays, unused positions being set to -1.
+    '''
+    def __init__(self, offsprings, max_nb_positions):
+        '''
+        Parameters
+        ----------
+        - the offsprings (as a numpy array) that are going to be mutated
+        - the maximum number of genes changed by a single mutation
+        '''
+        nb_offsprings = offsprings.shape[0]
+        self.nb_mutated = 0
+        self.idxs = np.zeros(nb_offsprings, dtype=np.int64)
+        self.positions = -1*np.ones((nb_offsprings, max_nb_positions),
+                                    dtype=np.int64)
+        self.genes = np.zeros((nb_offsprings, max_nb_positions),
+                              dtype=offsprings.dtype)
+
+    def add(self, idx, positions, genes):
+        '''
+        Record the mutation of offspring idx, BEFORE it is applied
+        Parameters
+        ----------
+        - the index of the mutated offspring
+        - the positions of the genes to be changed
+        - the genes at these positions (before mutation)
+        '''
+        k = len(positions)
+        self.idxs[self.nb_mutated] = idx
+        self.positions[self.nb_mutated, :k] = positions
+        self.genes[self.nb_mutated, :k] = genes
+        self.nb_mutated = self.nb_mutated + 1
+
+    def save(self, mutation_op):
+        '''
+        Store the recorded mutations on the mutation operator as
+        mutated_idxs, mutated_positions and mutated_genes
+        '''
+        mutation_op.mutated_idxs = self.idxs[:self.nb_mutated]
+        mutation_op.mutated_positions = self.positions[:self.nb_mutated]
+        mutation_op.mutated_genes = self.genes[:self.nb_mutated]
+
+
 class Mutation_Swap:
     '''
     The Swap Mutation operator: Two genes are randomly selected
     and swapped together.
+    In batched mode, the offsprings to mutate and their genes to swap
+    are drawn at once and swapped with fancy indexing.
     '''
-    def __init__(self, mutation_params):
+    def __init__(self, mutation_params, rng=None):
         '''
         Parameters:
         -----------
         - the mutation probability
+        - batched (optional, default True): mutate all the offsprings
+            at once
+        - backend (optional, default "numpy"): how the batched mutation
+            moves the genes, one of ("numpy", "numba")
+        - rng (optional): the seed or numpy random Generator of the
+            operator, drawn from for all its calls
         '''
         self.mutation_proba = mutation_params["mutation_proba"]
+        self.batched = mutation_params.get("batched", True)
+        self.backend = ga_numba.get_backend(
+            mutation_params.get("backend", "numpy"))
+        self.rng = np.random.default_rng(rng)
 
     def mutate(self, offsprings):
         '''
@@ -236,10 +711,16 @@ class Mutation_Swap:
         ------
         - the modified offsprings (althought not necessary as mutation
             is done inplace)
+        The mutations are kept as self.mutated_idxs,
+        self.mutated_positions and self.mutated_genes (see Mutation_Record)
         '''
-        rng = np.random.default_rng()
+        if self.batched:
+            return(self.mutate_batch(offsprings))
+
+        rng = self.rng
         nb_offsprings = offsprings.shape[0]
         dim = offsprings.shape[1]
+        record = Mutation_Record(offsprings, 2)
 
         for i in range(nb_offsprings):
             # Probability of performing mutation
@@ -247,10 +728,52 @@ class Mutation_Swap:
             # else NO mutation for this offspring
             if rng.uniform() < self.mutation_proba:
                 idxs = rng.choice(dim, size=2, replace=False)
+                record.add(i, idxs, offsprings[i][idxs])
                 temp = offsprings[i][idxs[0]]
                 offsprings[i][idxs[0]] = offsprings[i][idxs[1]]
                 offsprings[i][idxs[1]] = temp
 
+        record.save(self)
+
+        return(offsprings)
+
+    def mutate_batch(self, offsprings):
+        '''
+        Perform the swap mutation for all offsprings at once
+        Parameters
+        ----------
+        - the offsprings (as a numpy array) on which to apply
+            the mutation
+        Return
+        ------
+        - the modified offsprings (althought not necessary as mutation
+            is done inplace)
+        '''
+        rng = self.rng
+        nb_offsprings = offsprings.shape[0]
+        dim = offsprings.shape[1]
+
+        # offsprings to mutate and two different genes for each
+        idxs = np.flatnonzero(rng.uniform(size=nb_offsprings)
+                              < self.mutation_proba)
+        genes1 = rng.integers(dim, size=idxs.shape[0])
+        genes2 = rng.integers(dim - 1, size=idxs.shape[0])
+        genes2 = genes2 + (genes2 >= genes1)
+
+        # swap them
+        positions = np.stack((genes1, genes2), axis=1)
+        if self.backend == "numba":
+            genes = ga_numba.move_genes(offsprings, idxs, positions,
+                                        positions[:, ::-1].copy())
+        else:
+            rows = idxs[:, np.newaxis]
+            genes = offsprings[rows, positions]
+            offsprings[rows, positions] = genes[:, ::-1]
+
+        self.mutated_idxs = idxs
+        self.mutated_positions = positions
+        self.mutated_genes = genes
+
         return(offsprings)
 
 
@@ -258,17 +781,31 @@ class Mutation_Inversion:
     '''
     The Inversion Mutation operator: A sequence of genes is
     randomly selected and inversed
+    In batched mode, the offsprings to mutate and their sequences are
+    drawn at once (the width of the sequences being drawn directly
+    instead of rejecting invalid sequences) and all the sequences are
+    inversed with fancy indexing.
     '''
-    def __init__(self, mutation_params):
+    def __init__(self, mutation_params, rng=None):
         '''
         Parameters:
         -----------
         - the mutation probability
         - the width of the sequence of genes on which to apply
         inversion
+        - batched (optional, default True): mutate all the offsprings
+            at once
+        - backend (optional, default "numpy"): how the batched mutation
+            moves the genes, one of ("numpy", "numba")
+        - rng (optional): the seed or numpy random Generator of the
+            operator, drawn from for all its calls
         '''
         self.mutation_proba = mutation_params["mutation_proba"]
         self.max_width = mutation_params["sequence_max_width"]
+        self.batched = mutation_params.get("batched", True)
+        self.backend = ga_numba.get_backend(
+            mutation_params.get("backend", "numpy"))
+        self.rng = np.random.default_rng(rng)
 
     def mutate(self, offsprings):
         '''
@@ -285,10 +822,16 @@ class Mutation_Inversion:
         ------
         - the modified offsprings (althought not necessary as mutation
             is done inplace)
+        The mutations are kept as self.mutated_idxs,
+        self.mutated_positions and self.mutated_genes (see Mutation_Record)
         '''
-        rng = np.random.default_rng()
+        if self.batched:
+            return(self.mutate_batch(offsprings))
+
+        rng = self.rng
         nb_offsprings = offsprings.shape[0]
         dim = offsprings.shape[1]
+        record = Mutation_Record(offsprings, self.max_width)
 
         for i in range(nb_offsprings):
             # !!!
@@ -299,7 +842,7 @@ class Mutation_Inversion:
             # The effect on the quality of this operator is unknown.
             # In theory, it will be better to also allow these
             # types of inversion, i.e. considering the array as a
-            # circular array
+            # circular array (see Mutation_Circular_Inversion)
 
             # Probability of performing mutation
             # if < self.mutation_proba perform mutation
@@ -314,69 +857,90 @@ class Mutation_Inversion:
                         invalid_sequence = False
 
                 # Inverse the sequence inplace
+                record.add(i, np.arange(seq[0], seq[1]),
+                           offsprings[i][seq[0]:seq[1]])
                 offsprings[i][seq[0]:seq[1]] = \
                     offsprings[i][seq[0]:seq[1]][::-1]
 
+        record.save(self)
+
         return(offsprings)
 
-    def mutate_x(self, offsprings):
-        rng = np.random.default_rng()
+    def mutate_batch(self, offsprings):
+        '''
+        Perform the inversion mutation for all offsprings at once
+        Parameters
+        ----------
+        - the offsprings (as a numpy array) on which to apply
+            the mutation
+        Return
+        ------
+        - the modified offsprings (althought not necessary as mutation
+            is done inplace)
+        '''
+        rng = self.rng
         nb_offsprings = offsprings.shape[0]
         dim = offsprings.shape[1]
 
-        for i in range(nb_offsprings):
-            # Probability of performing mutation
-            # if < self.mutation_proba perform mutation
-            # else NO mutation for this offspring
-            if rng.uniform() < self.mutation_proba:
-                # Find a sequence of gene to inverse
-                invalid_sequence = True
-                while invalid_sequence:
-                    seq = rng.choice(dim, size=2, replace=False)
-                    g1 = seq[0]
-                    g2 = seq[1]
-                    if (abs(g1 - g2) <= self.max_width) and\
-                       (abs(g1 - g2) > 1):
-                        invalid_sequence = False
+        # offsprings to mutate and their sequence of genes
+        idxs = np.flatnonzero(rng.uniform(size=nb_offsprings)
+                              < self.mutation_proba)
+        starts, widths = self.get_sequences(rng, idxs.shape[0], dim)
+        positions, valid = get_sequences_positions(starts, widths,
+                                                   self.max_width, dim)
 
-                # if gene1 position is > gene2 position, we need
-                # to build the sequence to inverse first, that is
-                # offspring[g1:] + oggspring[:g2]
-                # then inverse it and insert/replace in offspring
-                # at the correct position
-                if g1 > g2:
-                    # Build the reverse sequence
-                    seq1 = offsprings[i][g1:]
-                    seq2 = offsprings[i][:g2]
-                    seq_to_reverse = np.concatenate((seq1, seq2))
-                    seq1_size = seq1.shape[0]
-
-                    # insert at the correct position
-                    offsprings[i][g1:] = seq_to_reverse[::-1][:seq1_size]
-                    offsprings[i][:g2] = seq_to_reverse[::-1][seq1_size:]
+        # inverse the sequences: the gene at position start + k comes
+        # from position start + width - 1 - k
+        offsets = np.arange(self.max_width)
+        sources = np.where(valid, (starts[:, np.newaxis]
+                                   + widths[:, np.newaxis] - 1 - offsets)
+                           % dim, 0)
+        genes = move_sequences_genes(offsprings, idxs, positions, sources,
+                                     valid, self.backend)
 
-                else:
-                    # Inverse the sequence inplace
-                    offsprings[i][g1:g2] = offsprings[i][g1:g2][::-1]
+        self.mutated_idxs = idxs
+        self.mutated_positions = positions
+        self.mutated_genes = genes
 
         return(offsprings)
 
+    def get_sequences(self, rng, size, dim):
+        '''
+        Draw the sequences of genes to inverse (not wrapping around
+        the end of the offsprings)
+        '''
+        return(sample_sequences(rng, size, dim, self.max_width))
+
 
 class Mutation_Scramble:
     '''
     The Scramble (or Shuffle) Mutation operator: A sequence of genes
     is randomly selected and shuffled
+    In batched mode, the offsprings to mutate and their sequences are
+    drawn at once (the width of the sequences being drawn directly
+    instead of rejecting invalid sequences) and all the sequences are
+    shuffled by sorting random keys.
     '''
-    def __init__(self, mutation_params):
+    def __init__(self, mutation_params, rng=None):
         '''
         Parameters:
         -----------
         - the mutation probability
         - the width of the sequence of genes on which to apply
             shuffling
+        - batched (optional, default True): mutate all the offsprings
+            at once
+        - backend (optional, default "numpy"): how the batched mutation
+            moves the genes, one of ("numpy", "numba")
+        - rng (optional): the seed or numpy random Generator of the
+            operator, drawn from for all its calls
         '''
         self.mutation_proba = mutation_params["mutation_proba"]
         self.max_width = mutation_params["sequence_max_width"]
+        self.batched = mutation_params.get("batched", True)
+        self.backend = ga_numba.get_backend(
+            mutation_params.get("backend", "numpy"))
+        self.rng = np.random.default_rng(rng)
 
     def mutate(self, offsprings):
         '''
@@ -393,10 +957,16 @@ class Mutation_Scramble:
         ------
         - the modified offsprings (althought not necessary as mutation
             is done inplace)
+        The mutations are kept as self.mutated_idxs,
+        self.mutated_positions and self.mutated_genes (see Mutation_Record)
         '''
-        rng = np.random.default_rng()
+        if self.batched:
+            return(self.mutate_batch(offsprings))
+
+        rng = self.rng
         nb_offsprings = offsprings.shape[0]
         dim = offsprings.shape[1]
+        record = Mutation_Record(offsprings, self.max_width)
 
         for i in range(nb_offsprings):
             # !!!
@@ -408,7 +978,7 @@ class Mutation_Scramble:
             # The effect on the quality of this operator is unknown.
             # In theory, it will be better to also allow these
             # types of shuffling, i.e. considering the array as a
-            # circular array
+            # circular array (see Mutation_Circular_Scramble)
 
             # Probability of performing mutation
             # if < self.mutation_proba perform mutation
@@ -423,55 +993,324 @@ class Mutation_Scramble:
                         invalid_sequence = False
 
                 # Shuffle the sequence inplace
+                record.add(i, np.arange(seq[0], seq[1]),
+                           offsprings[i][seq[0]:seq[1]])
                 rng.shuffle(offsprings[i][seq[0]:seq[1]])
 
+        record.save(self)
+
         return(offsprings)
 
-    def mutate_x(self, offsprings):
+    def mutate_batch(self, offsprings):
         '''
-        Perform the scramble mutation for all offsprings
-        1. roll a (uniform!) dice ! If probability is < than
-            mutation_proba then perform mutation.
-        2. Select (random uniform) a sequence of genes to scramble
-        3. shuffle them
+        Perform the scramble mutation for all offsprings at once
         Parameters
         ----------
-        - The offsprings (as a numpy array) on which to apply
+        - the offsprings (as a numpy array) on which to apply
             the mutation
         Return
         ------
         - the modified offsprings (althought not necessary as mutation
             is done inplace)
         '''
-        rng = np.random.default_rng()
+        rng = self.rng
         nb_offsprings = offsprings.shape[0]
         dim = offsprings.shape[1]
 
-        for i in range(nb_offsprings):
-            # !!!
-            # Similarly to the Mutation Inversion operator,
-            # by ordering the random choice of index, we somehow
-            # prevent shuffling happening on the array bounds,
-            # i.e. shuffling on say indexes 8.9.0.1 -> 9.1.0.8
-            # will never happen.
-            # The effect on the quality of this operator is unknown.
-            # In theory, it will be better to also allow these
-            # types of shuffling, i.e. considering the array as a
-            # circular array
+        # offsprings to mutate and their sequence of genes
+        idxs = np.flatnonzero(rng.uniform(size=nb_offsprings)
+                              < self.mutation_proba)
+        starts, widths = self.get_sequences(rng, idxs.shape[0], dim)
+        positions, valid = get_sequences_positions(starts, widths,
+                                                   self.max_width, dim)
 
-            # Probability of performing mutation
-            # if < self.mutation_proba perform mutation
-            # else NO mutation for this offspring
-            if rng.uniform() < self.mutation_proba:
-                # Find a sequence of gene to shuffle
-                invalid_sequence = True
-                while invalid_sequence:
-                    seq = np.sort(rng.choice(dim, size=2, replace=False))
-                    if ((seq[1] - seq[0]) <= self.max_width) and\
-                       ((seq[1] - seq[0]) > 1):
-                        invalid_sequence = False
+        # shuffle the sequences: sorting random keys (unused positions
+        # last) gives a random permutation of every sequence
+        keys = np.where(valid, rng.uniform(size=valid.shape), 2)
+        sources = np.where(valid, (starts[:, np.newaxis]
+                                   + np.argsort(keys, axis=1)) % dim, 0)
+        genes = move_sequences_genes(offsprings, idxs, positions, sources,
+                                     valid, self.backend)
 
-                # Shuffle the sequence inplace
-                rng.shuffle(offsprings[i][seq[0]:seq[1]])
+        self.mutated_idxs = idxs
+        self.mutated_positions = positions
+        self.mutated_genes = genes
 
         return(offsprings)
+
+    def get_sequences(self, rng, size, dim):
+        '''
+        Draw the sequences of genes to shuffle (not wrapping around
+        the end of the offsprings)
+        '''
+        return(sample_sequences(rng, size, dim, self.max_width))
+
+
+class Mutation_Circular_Inversion(Mutation_Inversion):
+    '''
+    The Circular Inversion Mutation operator: A sequence of genes is
+    randomly selected and inversed, the offspring being considered as
+    a circular array, i.e. inversion on say indexes 8.9.0.1 -> 1.0.9.8
+    can happen.
+    The mutation is always performed for all offsprings at once.
+    '''
+    def mutate(self, offsprings):
+        return(self.mutate_batch(offsprings))
+
+    def get_sequences(self, rng, size, dim):
+        '''
+        Draw the sequences of genes to inverse, possibly wrapping
+        around the end of the offsprings
+        '''
+        return(sample_circular_sequences(rng, size, dim, self.max_width))
+
+
+class Mutation_Circular_Scramble(Mutation_Scramble):
+    '''
+    The Circular Scramble Mutation operator: A sequence of genes is
+    randomly selected and shuffled, the offspring being considered as
+    a circular array, i.e. shuffling on say indexes 8.9.0.1 -> 9.1.0.8
+    can happen.
+    The mutation is always performed for all offsprings at once.
+    '''
+    def mutate(self, offsprings):
+        return(self.mutate_batch(offsprings))
+
+    def get_sequences(self, rng, size, dim):
+        '''
+        Draw the sequences of genes to shuffle, possibly wrapping
+        around the end of the offsprings
+        '''
+        return(sample_circular_sequences(rng, size, dim, self.max_width))
+
+
+# ----------------------
+# LOCAL SEARCH OPERATORS
+# ----------------------
+class Local_Search_2Opt:
+    '''
+    The 2-opt (and Or-opt) Local Search operator for TSP problems:
+    individuals (paths) are improved until no improving move can be
+    found in the neighbourhood of their cities.
+    - 2-opt: remove two edges (a, b), (c, d) and reconnect the path with
+        (a, c), (b, d), i.e. reverse the sequence of cities b..c
+    - Or-opt: move a sequence of 1 to 3 cities (possibly reversed)
+        between two other consecutive cities
+    Only moves creating an edge between a city and one of its
+    nb_neighbours nearest cities are considered (neighbour lists), and
+    cities whose neighbourhood has not changed since they have been
+    checked are skipped (don't-look bits).
+    '''
+    def __init__(self, local_search_params, problem, rng=None):
+        '''
+        Parameters:
+        -----------
+        local_search_params includes (all optional):
+        - apply_to: the individuals to improve. One of:
+            ("offsprings", "elites"), default "offsprings"
+        - local_search_proba: the probability for an individual to be
+            improved, default 1
+        - nb_neighbours: the size of the neighbour lists, default 8
+        - or_opt: whether to also try Or-opt moves, default True
+        the problem, providing the distance matrix and the cities
+        coordinates (i.e. a TSP_Problem)
+        rng (optional): the seed or numpy random Generator of the
+        operator, drawn from for all its calls
+        '''
+        self.apply_to = local_search_params.get("apply_to", "offsprings")
+        if self.apply_to not in ("offsprings", "elites"):
+            raise NotImplementedError
+        self.local_search_proba = \
+            local_search_params.get("local_search_proba", 1)
+        self.nb_neighbours = local_search_params.get("nb_neighbours", 8)
+        self.or_opt = local_search_params.get("or_opt", True)
+        self.rng = np.random.default_rng(rng)
+
+        # cities are numbered from 1 to DIM, but are handled from 0 to
+        # DIM - 1 here. Plain python lists are much faster than
+        # numpy arrays for the scalar accesses of the local search
+        self.neighbours = (problem.get_neighbours(self.nb_neighbours)
+                           - 1).tolist()
+        self.distances = problem.dist_matrix.tolist()
+
+    def improve(self, individuals, fitness=None):
+        '''
+        Improve (inplace) the individuals
+        1. roll a (uniform!) dice ! If probability is < than
+            local_search_proba then improve the individual
+        2. apply 2-opt / Or-opt moves until none is improving
+        Parameters
+        ----------
+        - the individuals (as a numpy array) to improve
+        - their fitness (optional), updated inplace with the gains
+        Return
+        ------
+        - the improved individuals (althought not necessary as the
+            local search is done inplace)
+        '''
+        rng = self.rng
+        nb_individuals = individuals.shape[0]
+        improved = rng.uniform(size=nb_individuals) < self.local_search_proba
+
+        for i in np.flatnonzero(improved):
+            path, gain = self.improve_path((individuals[i] - 1).tolist())
+            if gain > 0:
+                individuals[i] = np.array(path) + 1
+                if fitness is not None:
+                    fitness[i] = fitness[i] - gain
+
+        return(individuals)
+
+    def improve_path(self, path):
+        '''
+        Apply 2-opt / Or-opt moves on a path until none is improving
+        Parameters
+        ----------
+        - the path as a python list of cities (from 0 to DIM - 1)
+        Return
+        ------
+        - the improved path and the total gain (decrease of distance)
+        '''
+        n = len(path)
+        position = [0] * n
+        for idx, city in enumerate(path):
+            position[city] = idx
+
+        # cities to check, i.e. with a "don't look bit" off
+        to_check = list(path)
+        checked = [False] * n
+        total_gain = 0
+
+        while to_check:
+            a = to_check.pop()
+            checked[a] = True
+
+            move = self.two_opt_move(a, path, position)
+            if move is None and self.or_opt:
+                move = self.or_opt_move(a, path, position)
+            if move is None:
+                continue
+
+            # the move has been applied, the cities at the end of the
+            # changed edges have to be checked again
+            gain, cities = move
+            total_gain = total_gain + gain
+            for city in cities:
+                if checked[city]:
+                    checked[city] = False
+                    to_check.append(city)
+
+        return(path, total_gain)
+
+    def two_opt_move(self, a, path, position):
+        '''
+        Look for (and apply) an improving 2-opt move creating an edge
+        between a and one of its neighbours c
+        Return
+        ------
+        - None if no improving move, else (gain, changed cities)
+        '''
+        d = self.distances
+        n = len(path)
+        for step in (1, -1):
+            # b is the next city after a in this direction
+            b = path[(position[a] + step) % n]
+            d_ab = d[a][b]
+            for c in self.neighbours[a]:
+                d_ac = d[a][c]
+                # neighbours are sorted, no more gain possible
+                if d_ac >= d_ab:
+                    break
+                dd = path[(position[c] + step) % n]
+                if c == b or dd == a:
+                    continue
+                gain = d_ab + d[c][dd] - d_ac - d[b][dd]
+                if gain > 0:
+                    # (a, b), (c, dd) -> (a, c), (b, dd)
+                    if step == 1:
+                        self.reverse(path, position, position[b], position[c])
+                    else:
+                        self.reverse(path, position, position[c], position[b])
+                    return(gain, (a, b, c, dd))
+        return(None)
+
+    def or_opt_move(self, a, path, position):
+        '''
+        Look for (and apply) an improving Or-opt move, i.e. moving a
+        sequence of 1 to 3 cities starting with a between one of a's
+        neighbours c and the city next to c
+        Return
+        ------
+        - None if no improving move, else (gain, changed cities)
+        '''
+        d = self.distances
+        n = len(path)
+        start = position[a]
+        for length in (1, 2, 3):
+            if length > n - 4:
+                break
+            end = (start + length - 1) % n
+            sequence = [path[(start + k) % n] for k in range(length)]
+            first, last = sequence[0], sequence[-1]
+            prev_city = path[(start - 1) % n]
+            next_city = path[(end + 1) % n]
+            removal_gain = d[prev_city][first] + d[last][next_city] \
+                - d[prev_city][next_city]
+            for c in self.neighbours[a]:
+                if d[a][c] >= removal_gain:
+                    break
+                if c in sequence:
+                    continue
+                # insert between c and the city after (or before) c
+                for step in (1, -1):
+                    e = path[(position[c] + step) % n]
+                    if e in sequence:
+                        continue
+                    # a is connected to c, the sequence being
+                    # reversed or not depending on the direction
+                    gain = removal_gain + d[c][e] - d[c][a] - d[last][e]
+                    if gain > 0:
+                        self.move_sequence(path, position, start, length,
+                                           c, e, step)
+                        return(gain, (prev_city, next_city, c, e,
+                                      first, last))
+        return(None)
+
+    def reverse(self, path, position, i, j):
+        '''
+        Reverse (inplace) the circular sequence of the path from
+        position i to position j (included). The shortest of this
+        sequence and its complement is reversed, which gives the
+        same tour.
+        '''
+        n = len(path)
+        length = (j - i) % n + 1
+        if 2*length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        for _ in range(length // 2):
+            city_i, city_j = path[i], path[j]
+            path[i], path[j] = city_j, city_i
+            position[city_j], position[city_i] = i, j
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    def move_sequence(self, path, position, start, length, c, e, step):
+        '''
+        Move (inplace) the sequence of length cities starting at
+        position start between cities c and e, with the first city of
+        the sequence next to c
+        '''
+        n = len(path)
+        sequence = [path[(start + k) % n] for k in range(length)]
+        rest = [path[(start + length + k) % n] for k in range(n - length)]
+        idx_c = rest.index(c)
+        if step == 1:
+            # ... c, first .. last, e ...
+            new_path = rest[:idx_c + 1] + sequence + rest[idx_c + 1:]
+        else:
+            # ... e, last .. first, c ...
+            new_path = rest[:idx_c] + sequence[::-1] + rest[idx_c:]
+        path[:] = new_path
+        for idx, city in enumerate(path):
+            position[city] = idx
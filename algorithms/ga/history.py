@@ -0,0 +1,306 @@
+import os
+import glob
+import warnings
+
+
+import numpy as np
+
+# pyarrow is optional: without it, the ring history is written as npz
+try:
+    import pyarrow
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+class List_History:
+    '''
+    The history of a population kept in memory as a list of logs, one
+    per generation: [generation, best_fitness, best_individual,
+    fitness_mean, nb_evaluations]
+    '''
+    def __init__(self, history_params={}):
+        '''
+        Parameters
+        ----------
+        - history_params: unused
+        '''
+        self.logs = []
+
+    def append(self, generation, best_fitness, best_individual,
+               fitness_mean, nb_evaluations, improved):
+        '''
+        Store the logs of a generation
+        Parameters
+        ----------
+        - the generation
+        - the best fitness of the generation
+        - the best individual of the generation (copied, as the
+            buffers of the population are overwritten)
+        - the mean fitness of the generation
+        - the number of evaluations of the generation
+        - whether the best fitness of all time has been improved
+        '''
+        self.logs.append([generation, best_fitness, best_individual.copy(),
+                          fitness_mean, nb_evaluations])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Ring_History:
+    '''
+    The history of a population kept in fixed-size numpy ring buffers
+    (one per column: generation, best_fitness, fitness_mean and
+    nb_evaluations), so that the memory used does not grow with the
+    number of generations. The best individual is only stored when the
+    best fitness of all time is improved.
+    If a directory is given, the buffers are written to disk as a
+    columnar chunk every flush_interval generations, every time they
+    are full and when flushed, so that a crash loses at most
+    flush_interval generations: files
+    history_<chunk>.npz (or .parquet, with pyarrow), each file being
+    written atomically (temporary file renamed). Otherwise, only the
+    last size generations are kept.
+    The whole history written to disk is read back with load_history.
+    '''
+    def __init__(self, history_params={}):
+        '''
+        Parameters
+        ----------
+        history_params includes (all optional):
+        - size: the number of generations of the ring buffers,
+            default 1024
+        - directory: the directory in which to write the chunks,
+            default None (nothing written)
+        - format: the file format of the chunks. One of:
+            ("npz", "parquet"), default "npz". "parquet" requires
+            pyarrow, else "npz" is used
+        - flush_interval: the number of generations after which the
+            buffers are written to disk, even if not full, default 100
+            (None: only when full)
+        '''
+        self.size = history_params.get("size", 1024)
+        self.directory = history_params.get("directory", None)
+        self.format = history_params.get("format", "npz")
+        self.flush_interval = history_params.get("flush_interval", 100)
+        if self.format not in ("npz", "parquet"):
+            raise NotImplementedError
+        if self.format == "parquet" and not PYARROW_AVAILABLE:
+            warnings.warn("pyarrow is not installed, falling back to the "
+                          "npz format")
+            self.format = "npz"
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+        # ring buffers, self.nb_logs generations being stored (the last
+        # one at self.position - 1)
+        self.generation = np.zeros(self.size, dtype=np.int64)
+        self.best_fitness = np.zeros(self.size)
+        self.fitness_mean = np.zeros(self.size)
+        self.nb_evaluations = np.zeros(self.size, dtype=np.int64)
+        self.position = 0
+        self.nb_logs = 0
+
+        # improvements of the best fitness of all time since the last
+        # chunk: (generation, best_fitness, best_individual)
+        self.improvements = []
+        self.chunk = 0
+
+    def append(self, generation, best_fitness, best_individual,
+               fitness_mean, nb_evaluations, improved):
+        '''
+        Store the logs of a generation (see List_History.append), the
+        best individual being copied only if improved
+        '''
+        i = self.position
+        self.generation[i] = generation
+        self.best_fitness[i] = best_fitness
+        self.fitness_mean[i] = fitness_mean
+        self.nb_evaluations[i] = nb_evaluations
+        if improved:
+            self.improvements.append((generation, best_fitness,
+                                      best_individual.copy()))
+
+        self.position = (self.position + 1) % self.size
+        self.nb_logs = min(self.nb_logs + 1, self.size)
+        if self.directory is not None and \
+           (self.nb_logs == self.size or
+            (self.flush_interval is not None and
+             self.nb_logs >= self.flush_interval)):
+            self.flush()
+
+        # without directory, forget the improvements made before the
+        # oldest generation kept (but the best individual at that time)
+        oldest_generation = self.generation[self.get_order()[:1]]
+        while len(self.improvements) > 1 and \
+                self.improvements[1][0] <= oldest_generation:
+            self.improvements.pop(0)
+
+    def get_order(self):
+        '''
+        Return
+        ------
+        - the positions of the stored generations in the ring buffers,
+            oldest first
+        '''
+        return((self.position - self.nb_logs + np.arange(self.nb_logs))
+               % self.size)
+
+    @property
+    def logs(self):
+        '''
+        The generations still in memory, as lists of [generation,
+        best_fitness, best_individual, fitness_mean, nb_evaluations]
+        like List_History.logs. As only the improvements are stored,
+        best_individual is the best individual found so far (None if
+        it has been flushed already)
+        '''
+        best_individual = None
+        improvements = iter(self.improvements)
+        improvement = next(improvements, None)
+        logs = []
+        for i in self.get_order():
+            while improvement is not None and \
+                  improvement[0] <= self.generation[i]:
+                best_individual = improvement[2]
+                improvement = next(improvements, None)
+            logs.append([self.generation[i], self.best_fitness[i],
+                         best_individual, self.fitness_mean[i],
+                         self.nb_evaluations[i]])
+        return(logs)
+
+    def flush(self):
+        '''
+        Write the generations in memory (if any) as a new chunk and
+        empty the buffers. Nothing is done without a directory.
+        '''
+        if self.directory is None or self.nb_logs == 0:
+            return
+        order = self.get_order()
+        columns = {"generation": self.generation[order],
+                   "best_fitness": self.best_fitness[order],
+                   "fitness_mean": self.fitness_mean[order],
+                   "nb_evaluations": self.nb_evaluations[order]}
+        improvements = {
+            "generation": np.array([imp[0] for imp in self.improvements],
+                                   dtype=np.int64),
+            "best_fitness": np.array([imp[1] for imp in self.improvements],
+                                     dtype=np.float64)}
+        if len(self.improvements) > 0:
+            improvements["best_individual"] = \
+                np.stack([imp[2] for imp in self.improvements])
+
+        path = os.path.join(self.directory,
+                            "history_%06d.%s" % (self.chunk, self.format))
+        if self.format == "parquet":
+            write_parquet_chunk(path, columns, improvements)
+        else:
+            write_npz_chunk(path, columns, improvements)
+
+        self.chunk = self.chunk + 1
+        self.position = 0
+        self.nb_logs = 0
+        self.improvements = []
+
+    def close(self):
+        '''
+        Write the last generations to disk
+        '''
+        self.flush()
+
+
+def write_npz_chunk(path, columns, improvements):
+    '''
+    Write (atomically) a chunk of history as a npz file, the
+    improvements' columns being prefixed with "improvements_"
+    '''
+    arrays = dict(columns)
+    arrays.update({"improvements_" + name: array
+                   for name, array in improvements.items()})
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(temporary_path, path)
+
+
+def write_parquet_chunk(path, columns, improvements):
+    '''
+    Write (atomically) a chunk of history as a parquet file, the
+    improvements being stored as a second file <path>.improvements
+    (the best individuals as fixed-size lists)
+    '''
+    tables = [(path, pyarrow.table(columns))]
+    improvements = dict(improvements)
+    if "best_individual" in improvements:
+        individuals = improvements["best_individual"]
+        improvements["best_individual"] = \
+            pyarrow.FixedSizeListArray.from_arrays(individuals.ravel(),
+                                                   individuals.shape[1])
+    tables.append((path + ".improvements", pyarrow.table(improvements)))
+    # the improvements first, so that a chunk is complete once its main
+    # file exists
+    for table_path, table in tables[::-1]:
+        temporary_path = table_path + ".tmp"
+        pyarrow.parquet.write_table(table, temporary_path)
+        os.replace(temporary_path, table_path)
+
+
+def load_history(directory):
+    '''
+    Read back the history written by a Ring_History
+    Parameters
+    ----------
+    - the directory of the chunks
+    Return
+    ------
+    - a dictionary of numpy arrays: generation, best_fitness,
+        fitness_mean and nb_evaluations (one value per generation),
+        improvements_generation, improvements_best_fitness and
+        improvements_best_individual (one value per improvement of the
+        best fitness of all time)
+    '''
+    columns = ("generation", "best_fitness", "fitness_mean",
+               "nb_evaluations")
+    improvements_columns = ("generation", "best_fitness", "best_individual")
+    history = {name: [] for name in columns}
+    history.update({"improvements_" + name: []
+                    for name in improvements_columns})
+
+    paths = glob.glob(os.path.join(directory, "history_*.npz")) + \
+        glob.glob(os.path.join(directory, "history_*.parquet"))
+    for path in sorted(paths):
+        if path.endswith(".npz"):
+            with np.load(path) as chunk:
+                chunk = dict(chunk)
+        else:
+            chunk = pyarrow.parquet.read_table(path).to_pydict()
+            improvements = pyarrow.parquet.read_table(
+                path + ".improvements").to_pydict()
+            chunk.update({"improvements_" + name: values
+                          for name, values in improvements.items()})
+        for name in history:
+            if name in chunk:
+                history[name].append(np.asarray(chunk[name]))
+
+    return({name: np.concatenate(arrays) if len(arrays) > 0
+            else np.zeros(0) for name, arrays in history.items()})
+
+
+def get_history(history="list", history_params={}):
+    '''
+    Build the history of a population. history is one of:
+        ("list", "ring") or an already built history
+    '''
+    if history == "list":
+        return(List_History(history_params))
+    elif history == "ring":
+        return(Ring_History(history_params))
+    elif hasattr(history, "append"):
+        return(history)
+    else:
+        raise NotImplementedError
@@ -0,0 +1,283 @@
+import math
+import traceback
+import multiprocessing
+
+
+import numpy as np
+
+
+from population import Population
+from ga import GA
+
+
+class Island_Error(RuntimeError):
+    '''
+    Raised by Island_Model.run when an island failed, with the
+    traceback of the island's exception as message
+    '''
+    pass
+
+
+class Island_Model:
+    '''
+    The Island Model: several populations (islands) evolve in parallel,
+    each one with its own Genetic Algorithm in a separate process.
+    Every migration_interval generations, the best individuals of every
+    island migrate to other islands according to the topology, where
+    they replace the worst individuals (if better).
+    '''
+    def __init__(self,
+                 problem,
+                 nb_islands=4,
+                 population_size=100,
+                 nb_generation=100,
+                 migration_interval=10,
+                 nb_migrants=2,
+                 topology="ring",
+                 ga_params={},
+                 seed=None,
+                 start_method="spawn"):
+        '''
+        Parameters
+        ----------
+        - the problem to solve
+        - the number of islands, i.e. of processes
+        - the population size of every island
+        - the number of generation to produce
+        - the number of generations between two migrations
+        - the number of best individuals migrating from every island
+        - the topology, i.e. from which islands an island receives
+            migrants. One of:
+            ("ring", "fully_connected", "random")
+            ring: from the previous island
+            fully_connected: from all the other islands (keeping the best
+                nb_migrants)
+            random: from a random other island, drawn at every migration
+        - ga_params: a dictionary of the parameters of the GA of every
+            island (e.g. elite_ratio, selection_op, crossover_params ...),
+            but nb_generation (set by the model) and seed (spawned from
+            the model's one)
+        - seed: the seed of the model (None, an int or a numpy
+            SeedSequence). Every island gets its own seed spawned from
+            it (for its population and its GA), and so does the random
+            topology, so that the islands' random streams are
+            independent and a run can be reproduced
+        - start_method: the multiprocessing start method of the
+            islands' processes, one of ("spawn", "forkserver", "fork").
+            Forking a process in which numba's parallel thread pool is
+            running (e.g. after a GA run with the numba backend) makes
+            the interpreter hang on exit, hence spawn by default. As
+            with any spawned process, a script running the model must
+            do so under an if __name__ == "__main__": guard
+        '''
+
+        # (almost) NO VALIDATION on parameters for now ...
+        self.problem = problem
+        self.nb_islands = nb_islands
+        self.population_size = population_size
+        self.nb_generation = nb_generation
+        self.migration_interval = migration_interval
+        self.nb_migrants = nb_migrants
+        if "nb_generation" in ga_params:
+            raise ValueError("nb_generation is a parameter of the island "
+                             "model, not of the islands' GA (ga_params)")
+        self.ga_params = ga_params
+        self.context = multiprocessing.get_context(start_method)
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+
+        if topology in ("ring", "fully_connected", "random"):
+            self.topology = topology
+        else:
+            raise NotImplementedError
+
+        self.logs = []
+        self.islands_logs = []
+        self.best_fitness = np.inf
+        self.best_individual = 0
+
+    def get_sources(self, rng):
+        '''
+        Return
+        ------
+        - for every island, the list of islands it receives migrants from
+        '''
+        islands = range(self.nb_islands)
+        if self.topology == "ring":
+            return([[(i - 1) % self.nb_islands] for i in islands])
+        elif self.topology == "fully_connected":
+            return([[j for j in islands if j != i] for i in islands])
+        else:
+            sources = rng.integers(self.nb_islands - 1, size=self.nb_islands)
+            return([[j + (j >= i)] for i, j in zip(islands, sources)])
+
+    def run(self):
+        '''
+        Do the thing !
+        Return
+        ------
+        - the merged logs of all the islands, i.e. for every generation
+            [generation, best_fitness, best_individual, fitness_mean,
+            nb_evaluations] (best over all islands, mean of the islands'
+            means, total number of evaluations) (see merge_logs)
+        The results of a previous run (logs, best individual) are
+        discarded. If an island fails, the other ones are terminated and
+        an Island_Error is raised with the island's traceback
+        '''
+        self.logs = []
+        self.islands_logs = []
+        self.best_fitness = np.inf
+        self.best_individual = 0
+
+        topology_seed, *islands_seeds = \
+            self.seed_sequence.spawn(self.nb_islands + 1)
+        rng = np.random.default_rng(topology_seed)
+        nb_epochs = math.ceil(self.nb_generation / self.migration_interval)
+
+        # start the islands
+        connections = []
+        processes = []
+        for island, island_seed in enumerate(islands_seeds):
+            connection, island_connection = self.context.Pipe()
+            process = self.context.Process(
+                target=_run_island,
+                args=(island_connection, island, self.problem,
+                      self.population_size, self.nb_generation,
+                      self.migration_interval, self.nb_migrants,
+                      self.ga_params, island_seed))
+            process.start()
+            connections.append(connection)
+            processes.append(process)
+
+        try:
+            # migrations
+            for _ in range(nb_epochs - 1):
+                emigrants = [_receive(connection)
+                             for connection in connections]
+                for connection, sources in zip(connections,
+                                               self.get_sources(rng)):
+                    individuals = np.concatenate([emigrants[i][0]
+                                                  for i in sources])
+                    fitness = np.concatenate([emigrants[i][1]
+                                              for i in sources])
+                    # keep the best nb_migrants (several sources when
+                    # fully connected)
+                    best_idxs = np.argsort(fitness)[:self.nb_migrants]
+                    connection.send((individuals[best_idxs],
+                                     fitness[best_idxs]))
+
+            # collect the results
+            results = [_receive(connection) for connection in connections]
+        except BaseException:
+            # (the other islands are waiting for migrants)
+            for process in processes:
+                process.terminate()
+            raise
+        finally:
+            for process in processes:
+                process.join()
+            for connection in connections:
+                connection.close()
+
+        self.islands_logs = [result[0] for result in results]
+        self.logs = self.merge_logs(self.islands_logs)
+        for _, best_fitness, best_individual in results:
+            if best_fitness < self.best_fitness:
+                self.best_fitness = best_fitness
+                self.best_individual = best_individual
+
+        return(self.logs)
+
+    def merge_logs(self, islands_logs):
+        '''
+        Merge the logs of the islands by generation number. An island
+        stopped early by a stopping criteria (see the GA's
+        stagnation_params) has no log for the following generations:
+        its last log still counts for the best fitness, but not for the
+        mean fitness and the number of evaluations
+        Return
+        ------
+        - the merged logs (see run)
+        '''
+        generations = sorted({log[0] for island_logs in islands_logs
+                              for log in island_logs})
+        positions = [0] * len(islands_logs)
+        last_logs = [None] * len(islands_logs)
+        logs = []
+        for generation in generations:
+            current_logs = []
+            for i, island_logs in enumerate(islands_logs):
+                if positions[i] < len(island_logs) and \
+                   island_logs[positions[i]][0] == generation:
+                    last_logs[i] = island_logs[positions[i]]
+                    current_logs.append(last_logs[i])
+                    positions[i] = positions[i] + 1
+            best_log = min([log for log in last_logs if log is not None],
+                           key=lambda log: log[1])
+            fitness_mean = np.mean([log[3] for log in current_logs])
+            nb_evaluations = sum([log[4] for log in current_logs])
+            logs.append([generation, best_log[1], best_log[2],
+                         fitness_mean, nb_evaluations])
+        return(logs)
+
+
+def _receive(connection):
+    '''
+    Receive a message from an island, raising the Island_Error it sent
+    if it failed
+    '''
+    message = connection.recv()
+    if isinstance(message, Island_Error):
+        raise message
+    return(message)
+
+
+def _run_island(connection, island, *args):
+    '''
+    Evolve an island (see _evolve_island), sending an Island_Error
+    with its traceback to the model if it fails
+    '''
+    try:
+        _evolve_island(connection, *args)
+    except Exception:
+        connection.send(Island_Error("island %d failed:\n%s"
+                                     % (island, traceback.format_exc())))
+    finally:
+        connection.close()
+
+
+def _evolve_island(connection, problem, population_size, nb_generation,
+                   migration_interval, nb_migrants, ga_params, seed):
+    '''
+    Evolve an island, sending its best individuals and receiving
+    migrants every migration_interval generations. An island whose GA
+    stops early (converged, see the GA's stagnation_params) does not
+    evolve any more, but still takes part in the migrations
+    '''
+    population_seed, ga_seed = seed.spawn(2)
+    population = Population(problem, population_size, seed=population_seed)
+    ga = GA(population, nb_generation=migration_interval,
+            **dict(ga_params, seed=ga_seed))
+
+    nb_epochs = math.ceil(nb_generation / migration_interval)
+    remaining_generation = nb_generation
+    stopped = False
+    for epoch in range(nb_epochs):
+        if not stopped:
+            ga.nb_generation = min(migration_interval, remaining_generation)
+            ga.run()
+            # (the generations actually done)
+            remaining_generation = remaining_generation - len(ga.timings)
+            stopped = ga.stop_reason != "nb_generation"
+
+        if epoch < nb_epochs - 1:
+            best_idxs = np.argsort(population.fitness)[:nb_migrants]
+            connection.send((population.individuals[best_idxs],
+                             population.fitness[best_idxs]))
+            population.replace_worst(*connection.recv())
+
+    connection.send((population.logs, population.best_fitness,
+                     population.best_individual))
+    population.close()
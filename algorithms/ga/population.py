@@ -1,32 +1,95 @@
 import numpy as np
 
 
+from evaluator import get_evaluator
+from fitness_cache import Fitness_Cache
+from history import get_history
+
+
 class Population:
     '''
     A Population is the set of solutions evolving according
     to the 'evolution' algorithm.
+    The population owns preallocated (population_size, dim) buffers
+    for the current individuals, the next generation (offsprings), the
+    selected parents and the individuals gathered for an evaluation
+    (scratch), plus the fitness vectors of the current and next
+    generations. All are C-contiguous, so that they can be written
+    through flat indexes and np.take(..., out=) without copies.
+    An algorithm writes the next generation in place in
+    self.offsprings / self.offsprings_fitness, and the current and
+    next buffers are swapped when the next generation is stored with
+    get_fitness(self.offsprings, ...).
+    The fitness is computed by an evaluator, either in the current
+    process ("serial", default) or across a pool of processes
+    ("process"), see evaluator.py.
+    The problem is expected to provide its type ("DISCRETE" or
+    "CONTINUOUS"), dim, lbound, ubound and a fitness function on a
+    matrix of individuals. Pygmo-like problems (e.g. Shifted_sphere)
+    are supported too: they are continuous, their bounds are given by
+    get_bounds() and their batch_fitness is used.
+    An optional fitness cache (see fitness_cache.py) avoids evaluating
+    again individuals already seen, e.g. duplicated TSP paths.
+    The random individuals are drawn from self.rng, built from the
+    (optional) seed of the population.
+    The logs of every generation are stored by a history (see
+    history.py), either as a list in memory ("list", default) or in
+    fixed-size ring buffers flushed to disk ("ring").
     '''
-    def __init__(self, problem, population_size):
+    def __init__(self, problem, population_size,
+                 evaluator="serial", evaluator_params={},
+                 fitness_cache=None, seed=None,
+                 history="list", history_params={}):
         self.dim = problem.dim
-        self.lbound = problem.lbound
-        self.ubound = problem.ubound
+        if hasattr(problem, "lbound"):
+            self.lbound = problem.lbound
+            self.ubound = problem.ubound
+        else:
+            self.lbound, self.ubound = \
+                (np.array(bounds) for bounds in problem.get_bounds())
         self.size = population_size
         self.generation = 0
         self.best_fitness = np.inf
         self.best_individual = 0
+        # seed: None, an int or a numpy SeedSequence
+        self.rng = np.random.default_rng(seed)
 
-        self.logs = []
+        # total number of fitness evaluations, and at the
+        # time of the last logs
+        self.nb_evaluations = 0
+        self.nb_evaluations_logged = 0
+
+        # logs of every generation: [generation, best_fitness,
+        # best_individual, fitness_mean, nb_evaluations]
+        self.history = get_history(history, history_params)
 
         # if discrete problem, use discrete_population
         # to generate the initial population
-        if problem.type == "DISCRETE":
+        self.type = getattr(problem, "type", "CONTINUOUS")
+        if self.type == "DISCRETE":
             self.individuals = self.get_discrete_population()
         else:
             self.individuals = self.get_continuous_population()
-        self.fitness = np.zeros(problem.dim)
-        self.fitness_func = problem.fitness
+        self.fitness = np.zeros(self.size)
+        self.problem = problem
+        self.evaluator = get_evaluator(problem, evaluator, evaluator_params)
+
+        # fitness_cache: None (no cache) or the dictionary of parameters
+        # of the cache (e.g. {"key": "permutation"} for TSP problems)
+        if fitness_cache is None:
+            self.fitness_cache = None
+        else:
+            self.fitness_cache = Fitness_Cache(self.evaluate_uncached,
+                                               fitness_cache)
 
-    def get_discrete_population(self):
+        # Buffers for the next generation, the parents and the
+        # individuals to evaluate
+        self.offsprings = np.empty_like(self.individuals, order="C")
+        self.offsprings_fitness = np.zeros(self.size)
+        self.parents = np.empty_like(self.individuals, order="C")
+        self.scratch = np.empty_like(self.individuals, order="C")
+
+    def get_discrete_population(self, size=None):
         '''
         Create an initial random population of "discrete"
         individuals (i.e. each individual's gene is an integer,
@@ -34,27 +97,30 @@ class Population:
         with each individual being of dimension self.dim
         Parameters:
         -----------
-        - population_size: The size of the population, i.e. the
-            number of individuals within the population
+        - size (optional): The number of individuals to create,
+            default the size of the population
         Return:
         -------
         - m: A np.ndarray of dimension (population_size, dim)
-            within the bounds of the problem
+            within the bounds of the problem, of the smallest
+            integer dtype holding the genes (e.g. uint8 for up to
+            255 genes)
         '''
+        # All the individuals are shuffled at once: every row of
+        # the matrix is permuted independently
         # self.ubound + 1 -> because np.arange -> [start, end[
-        rng = np.random.default_rng()
-        m = rng.choice(np.arange(self.lbound, self.ubound + 1),
-                       size=self.dim, replace=False)
-        for _ in range(self.size - 1):
-            m = np.concatenate((m,
-                                rng.choice(np.arange(self.lbound,
-                                                     self.ubound + 1),
-                                           size=self.dim,
-                                           replace=False)), axis=0)
-        m = m.reshape(-1, self.dim)
+        rng = self.rng
+        dtype = np.result_type(np.min_scalar_type(self.lbound),
+                               np.min_scalar_type(self.ubound))
+        genes = np.arange(self.lbound, self.ubound + 1, dtype=dtype)
+        if size is None:
+            size = self.size
+        m = np.empty((size, self.dim), dtype=dtype)
+        m[...] = genes
+        rng.permuted(m, axis=1, out=m)
         return(m)
 
-    def get_continuous_population(self):
+    def get_continuous_population(self, size=None):
         '''
         Create an initial random population of "continuous"
         individuals (i.e. each individual's gene is a real) of size
@@ -62,42 +128,169 @@ class Population:
         self.dim
         Parameters:
         -----------
-        - population_size: The size of the population, i.e. the
-            number of individuals within the population
+        - size (optional): The number of individuals to create,
+            default the size of the population
         Return:
         -------
         - m: A np.ndarray of dimension (population_size, dim)
             within the bounds of the problem
         '''
-        m = np.random.uniform(self.lbound,
-                              self.ubound,
-                              size=(self.size, self.dim))
+        if size is None:
+            size = self.size
+        m = self.rng.uniform(self.lbound,
+                             self.ubound,
+                             size=(size, self.dim))
         return(m)
 
-    def get_fitness(self, individuals):
+    def evaluate(self, individuals):
+        '''
+        Compute the fitness of some individuals from Problem class,
+        without updating the population
+        Return:
+        -------
+        - A np.ndarray of dimension (nb_individuals,)
+        '''
+        if self.fitness_cache is not None:
+            return(self.fitness_cache.evaluate(individuals))
+        return(self.evaluate_uncached(individuals))
+
+    def evaluate_uncached(self, individuals):
+        '''
+        Compute the fitness of some individuals with the evaluator
+        (bypassing the fitness cache) and count the evaluations
+        '''
+        self.nb_evaluations = self.nb_evaluations + individuals.shape[0]
+        return(self.evaluator.evaluate(individuals))
+
+    def set_evaluator(self, evaluator, evaluator_params={}):
+        '''
+        Change the evaluator of the population, i.e. one of
+        ("serial", "process") or an already built evaluator.
+        The previous evaluator is closed.
+        '''
+        self.evaluator.close()
+        self.evaluator = get_evaluator(self.problem, evaluator,
+                                       evaluator_params)
+
+    def replace_worst(self, individuals, fitness):
+        '''
+        Replace the worst individuals of the population by some
+        (better) individuals coming from elsewhere, e.g. migrants
+        from another island. The best newcomer replaces the worst
+        individual, and so on, as long as the newcomer is better.
+        Parameters:
+        -----------
+        - individuals: a np.ndarray of dimension (nb_individuals, dim)
+        - fitness: their fitness, of dimension (nb_individuals, )
+        '''
+        nb_individuals = min(individuals.shape[0], self.size)
+        newcomers_idxs = np.argsort(fitness)[:nb_individuals]
+        worst_idxs = np.argsort(self.fitness)[::-1][:nb_individuals]
+        better = fitness[newcomers_idxs] < self.fitness[worst_idxs]
+        newcomers_idxs = newcomers_idxs[better]
+        worst_idxs = worst_idxs[better]
+        self.individuals[worst_idxs] = individuals[newcomers_idxs]
+        self.fitness[worst_idxs] = fitness[newcomers_idxs]
+
+        # Update all time best
+        if newcomers_idxs.shape[0] > 0 and \
+           fitness[newcomers_idxs[0]] < self.best_fitness:
+            self.best_fitness = fitness[newcomers_idxs[0]]
+            self.best_individual = individuals[newcomers_idxs[0]].copy()
+
+    def get_diversity(self):
+        '''
+        Measure the diversity of the population, between 0 (all the
+        individuals are identical) and 1
+        Return
+        ------
+        - for a discrete problem, the ratio of distinct individuals
+        - for a continuous problem, the mean standard deviation of the
+            genes relative to the width of the bounds
+        '''
+        if self.type == "DISCRETE":
+            nb_distinct = np.unique(self.individuals, axis=0).shape[0]
+            return(nb_distinct / self.size)
+        return(np.mean(self.individuals.std(axis=0)
+                       / (self.ubound - self.lbound)))
+
+    def restart(self, nb_kept):
+        '''
+        Partial restart of a converged population: the nb_kept best
+        individuals are kept and the others are replaced by new random
+        individuals (which are evaluated)
+        '''
+        nb_kept = min(nb_kept, self.size)
+        new_idxs = np.argsort(self.fitness)[nb_kept:]
+        if self.type == "DISCRETE":
+            individuals = self.get_discrete_population(new_idxs.shape[0])
+        else:
+            individuals = self.get_continuous_population(new_idxs.shape[0])
+        self.individuals[new_idxs] = individuals
+        self.fitness[new_idxs] = self.evaluate(individuals)
+
+    @property
+    def logs(self):
+        '''
+        The logs of the generations kept in memory by the history
+        '''
+        return(self.history.logs)
+
+    def close(self):
+        '''
+        Release the resources of the evaluator (e.g. worker processes)
+        and write the end of the history
+        '''
+        self.evaluator.close()
+        self.history.close()
+
+    def get_fitness(self, individuals, fitness=None):
         '''
         Get the fitness for the current population from Problem
         class and store the result as self.fitness
+        Parameters:
+        -----------
+        - individuals: the new individuals of the population. If these
+            are the self.offsprings buffer, the current and next
+            generation buffers are swapped, else the individuals are
+            copied into the current generation buffer
+        - fitness: the fitness of these individuals if already known
+            (e.g. through delta evaluation). If None, it is computed
+            from Problem class
         Return:
         -------
-        - self.fitness: A np.ndarray of dimension (dim,)
+        - self.fitness: A np.ndarray of dimension (population_size,)
         '''
-        self.individuals = individuals
-        self.fitness = self.fitness_func(self.individuals)
+        if individuals is self.offsprings:
+            self.individuals, self.offsprings = \
+                self.offsprings, self.individuals
+            self.fitness, self.offsprings_fitness = \
+                self.offsprings_fitness, self.fitness
+        elif individuals is not self.individuals:
+            self.individuals[...] = individuals
+
+        if fitness is None:
+            fitness = self.evaluate(self.individuals)
+        if fitness is not self.fitness:
+            self.fitness[...] = fitness
 
         # store some logs
-        best_individual_idx = np.argsort(self.fitness)[0]
+        best_individual_idx = np.argmin(self.fitness)
         best_fitness = self.fitness[best_individual_idx]
         best_individual = self.individuals[best_individual_idx]
         fitness_mean = self.fitness.mean()
+        nb_evaluations = self.nb_evaluations - self.nb_evaluations_logged
+        self.nb_evaluations_logged = self.nb_evaluations
+        improved = best_fitness < self.best_fitness
 
-        self.logs.append([self.generation, best_fitness,
-                          best_individual, fitness_mean])
+        self.history.append(self.generation, best_fitness, best_individual,
+                            fitness_mean, nb_evaluations, improved)
         self.generation = self.generation + 1
 
         # Update all time best
-        if best_fitness < self.best_fitness:
+        # (copy, as the buffers are overwritten at each generation)
+        if improved:
             self.best_fitness = best_fitness
-            self.best_individual = best_individual
+            self.best_individual = best_individual.copy()
 
         return(self.fitness)
@@ -0,0 +1,279 @@
+from datetime import datetime
+
+
+import numpy as np
+
+
+from evaluation import batch_evaluate
+
+
+class Particle_Swarm_Optimisation:
+    '''
+    The Particle Swarm Optimisation algorithm (PSO), with the variants
+    and swarm topologies of pygmo's pso_gen, updating all the particles
+    at once: the velocities, positions and (personal and neighbourhood)
+    best positions are (swarm_size, dim) matrices and the neighbourhood
+    of every particle is a precomputed array of particle indexes.
+    Every generation:
+    1. the velocity of every particle is updated, attracted by its own
+        best position (cognitive component) and by the best position of
+        its neighbourhood (social component), and clamped to max_vel
+    2. the particles move. A particle out of the bounds is put on the
+        bound, with a null velocity
+    3. all the particles are evaluated at once, through the problem's
+        batch_fitness if available, and their best positions updated
+    '''
+    def __init__(self, problem, population_size, params):
+        '''
+        Parameters
+        ----------
+        - problem: the problem to optimise, pygmo-like, i.e. providing
+            get_bounds() and fitness(x) (or batch_fitness(dvs))
+        - population_size: the size of the swarm
+        - params: dictionary of parameters (see helpers.pso_gen):
+            * nb_generation: the number of generations
+            * omega: the inertia weight (or constriction factor,
+                depending on the variant), default 0.7298
+            * eta1: the cognitive component, default 2.05
+            * eta2: the social component, default 2.05
+            * max_vel: the maximum velocity, relative to the width of
+                the bounds, default 0.5
+            * variant: the algorithmic variant, default 5:
+                1 -> canonical (with inertia weight)
+                2 -> same social and cognitive random
+                3 -> same random for all components
+                4 -> only one random
+                5 -> canonical (with constriction factor)
+                6 -> fully informed (FIPS)
+            * neighb_type: the swarm topology, default 2:
+                1 -> gbest (global best)
+                2 -> lbest (local best, ring)
+                3 -> Von Neumann
+                4 -> Adaptive random
+            * neighb_param: the number of neighbours of the lbest
+                topology, or of particles informed by every particle
+                of the adaptive random topology, default 4
+            * seed: the seed of the random generator, default None
+        '''
+        self.problem = problem
+        self.size = population_size
+        self.nb_generation = params["nb_generation"]
+        self.omega = params.get("omega", 0.7298)
+        self.eta1 = params.get("eta1", 2.05)
+        self.eta2 = params.get("eta2", 2.05)
+        self.max_vel = params.get("max_vel", 0.5)
+        self.variant = params.get("variant", 5)
+        self.neighb_type = params.get("neighb_type", 2)
+        self.neighb_param = params.get("neighb_param", 4)
+        self.rng = np.random.default_rng(params.get("seed", None))
+
+        if self.variant not in range(1, 7) or \
+           self.neighb_type not in range(1, 5):
+            raise NotImplementedError
+
+        self.lbound, self.ubound = \
+            (np.array(bounds, dtype=np.float64)
+             for bounds in problem.get_bounds())
+        self.dim = self.lbound.shape[0]
+        self.max_velocity = self.max_vel * (self.ubound - self.lbound)
+        self.nb_evaluations = 0
+
+        self.neighbours, self.neighbours_valid = self.get_neighbours()
+
+    def evaluate(self, individuals):
+        '''
+        Compute the fitness of a (nb_individuals, dim) matrix of
+        individuals (see evaluation.batch_evaluate), counting the
+        evaluations
+        '''
+        self.nb_evaluations = self.nb_evaluations + individuals.shape[0]
+        return(batch_evaluate(self.problem, individuals))
+
+    def get_neighbours(self):
+        '''
+        Build the neighbourhood of every particle according to the
+        topology (as pygmo does, a particle is part of its own
+        neighbourhood in the gbest and adaptive random topologies only)
+        Return
+        ------
+        - neighbours: the indexes of the neighbours of every particle,
+            as a (swarm_size, nb_neighbours) array. Particles with less
+            neighbours than others have their row padded with their
+            first neighbour
+        - valid: the mask of the actual (not padding) neighbours
+        '''
+        n = self.size
+        particles = np.arange(n)[:, np.newaxis]
+        if self.neighb_type == 1:
+            # gbest: every particle is a neighbour of every particle
+            informed = np.ones((n, n), dtype=bool)
+        elif self.neighb_type == 2:
+            # lbest: neighb_param / 2 particles on each side in a ring
+            half = max(self.neighb_param // 2, 1)
+            offsets = np.concatenate((np.arange(-half, 0),
+                                      np.arange(1, half + 1)))
+            informed = np.zeros((n, n), dtype=bool)
+            np.put_along_axis(informed, (particles + offsets) % n, True,
+                              axis=1)
+        elif self.neighb_type == 3:
+            # Von Neumann: the particles are on a (torus) grid and
+            # their neighbours are the ones above, below, left and right
+            nb_columns = max(int(np.sqrt(n)), 1)
+            nb_rows = -(-n // nb_columns)
+            rows, columns = particles // nb_columns, particles % nb_columns
+            neighbours = np.concatenate(
+                (((rows - 1) % nb_rows) * nb_columns + columns,
+                 ((rows + 1) % nb_rows) * nb_columns + columns,
+                 rows * nb_columns + (columns - 1) % nb_columns,
+                 rows * nb_columns + (columns + 1) % nb_columns),
+                axis=1)
+            # (the last row of the grid may be incomplete)
+            exists = neighbours < n
+            informed = np.zeros((n, n), dtype=bool)
+            informed[np.broadcast_to(particles, neighbours.shape)[exists],
+                     neighbours[exists]] = True
+            np.fill_diagonal(informed, n == 1)
+        else:
+            # adaptive random: every particle informs itself and
+            # neighb_param random particles
+            informers = self.rng.integers(n, size=(n, self.neighb_param))
+            informed = np.zeros((n, n), dtype=bool)
+            informed[informers, particles] = True
+            np.fill_diagonal(informed, True)
+
+        # from the (swarm_size, swarm_size) mask to index arrays
+        nb_neighbours = informed.sum(axis=1).max()
+        neighbours = np.argsort(~informed, axis=1,
+                                kind="stable")[:, :nb_neighbours]
+        valid = np.take_along_axis(informed, neighbours, axis=1)
+        neighbours = np.where(valid, neighbours, neighbours[:, :1])
+        return(neighbours, valid)
+
+    def get_random(self, shape_components, shape_particles):
+        '''
+        Draw the random coefficients of the cognitive and social
+        components according to the variant
+        '''
+        if self.variant in (1, 5):
+            return(self.rng.uniform(size=shape_components),
+                   self.rng.uniform(size=shape_components))
+        elif self.variant == 2:
+            r = self.rng.uniform(size=shape_components)
+            return(r, r)
+        elif self.variant == 3:
+            return(self.rng.uniform(size=shape_particles),
+                   self.rng.uniform(size=shape_particles))
+        else:
+            r = self.rng.uniform(size=shape_particles)
+            return(r, r)
+
+    def update_velocities(self, positions, velocities, best_positions,
+                          best_fitness):
+        '''
+        Compute the new velocities of all the particles
+        '''
+        if self.variant == 6:
+            # FIPS: every neighbour contributes equally, with an
+            # acceleration coefficient eta1 + eta2
+            phi = self.eta1 + self.eta2
+            r = self.rng.uniform(size=self.neighbours.shape + (self.dim,))
+            r = r * self.neighbours_valid[:, :, np.newaxis]
+            attraction = (r * (best_positions[self.neighbours]
+                               - positions[:, np.newaxis])).sum(axis=1)
+            nb_neighbours = self.neighbours_valid.sum(axis=1)
+            return(self.omega * (velocities + phi * attraction
+                                 / nb_neighbours[:, np.newaxis]))
+
+        # best position of the neighbourhood of every particle
+        best_neighbours = np.take_along_axis(
+            self.neighbours,
+            np.argmin(best_fitness[self.neighbours], axis=1)[:, np.newaxis],
+            axis=1)[:, 0]
+        r1, r2 = self.get_random(positions.shape, (self.size, 1))
+        cognitive = self.eta1 * r1 * (best_positions - positions)
+        social = self.eta2 * r2 * (best_positions[best_neighbours]
+                                   - positions)
+        if self.variant == 5:
+            return(self.omega * (velocities + cognitive + social))
+        return(self.omega * velocities + cognitive + social)
+
+    def evolve(self):
+        '''
+        Do the thing !
+        Return
+        ------
+        - log: for every generation, (Gen, Fevals, gbest, Mean Vel.,
+            Mean lbest, Avg. Dist.) as pygmo's pso_gen logs, i.e. the
+            generation, the number of function evaluations, the best
+            fitness so far, the mean velocity and mean distance between
+            particles and swarm centre (both relative to the width of
+            the bounds), and the mean fitness of the best positions
+        - duration: the total duration of the resolution (a timedelta)
+        - champion_f: the best fitness, as an array of dimension (1, )
+        - champion_x: the best individual
+        '''
+        startt = datetime.now()
+        width = self.ubound - self.lbound
+        positions = self.rng.uniform(self.lbound, self.ubound,
+                                     size=(self.size, self.dim))
+        velocities = self.rng.uniform(-self.max_velocity, self.max_velocity,
+                                      size=(self.size, self.dim))
+        fitness = self.evaluate(positions)
+        best_positions = positions.copy()
+        best_fitness = fitness.copy()
+
+        log = []
+        for generation in range(1, self.nb_generation + 1):
+            champion_f = best_fitness.min()
+
+            # move the particles
+            velocities = self.update_velocities(positions, velocities,
+                                                best_positions, best_fitness)
+            np.clip(velocities, -self.max_velocity, self.max_velocity,
+                    out=velocities)
+            positions = positions + velocities
+
+            # particles out of the bounds are stopped on the bounds
+            out = (positions < self.lbound) | (positions > self.ubound)
+            np.clip(positions, self.lbound, self.ubound, out=positions)
+            velocities[out] = 0
+
+            # evaluate and update the best positions
+            fitness = self.evaluate(positions)
+            better = fitness < best_fitness
+            best_positions[better] = positions[better]
+            best_fitness[better] = fitness[better]
+
+            # adaptive random topology: new neighbourhoods when the best
+            # fitness has not been improved
+            if self.neighb_type == 4 and best_fitness.min() >= champion_f:
+                self.neighbours, self.neighbours_valid = \
+                    self.get_neighbours()
+
+            mean_velocity = np.mean(np.abs(velocities) / width)
+            mean_distance = np.mean(np.linalg.norm(
+                (positions - positions.mean(axis=0)) / width, axis=1))
+            log.append((generation, self.nb_evaluations, best_fitness.min(),
+                        mean_velocity, best_fitness.mean(), mean_distance))
+
+        duration = (datetime.now() - startt)
+        best_idx = np.argmin(best_fitness)
+        champion_f = best_fitness[best_idx:best_idx + 1]
+        champion_x = best_positions[best_idx].copy()
+
+        return(log, duration, champion_f, champion_x)
+
+
+def pso(problem, population_size, params):
+    '''
+    Execute the Particle Swarm Optimisation algorithm on an
+    optimisation problem with the population size and parameters
+    specified (see Particle_Swarm_Optimisation), like helpers.pso_gen
+    does with pygmo
+    Return
+    ------
+    - log, duration, champion_f, champion_x: see
+        Particle_Swarm_Optimisation.evolve
+    '''
+    algo = Particle_Swarm_Optimisation(problem, population_size, params)
+    return(algo.evolve())
@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def batch_evaluate(problem, individuals):
+    '''
+    Compute the fitness of a (nb_individuals, dim) matrix of
+    individuals, at once with the problem's batch_fitness if available
+    (i.e. pygmo's batch fitness protocol: flattened decision vectors
+    in, flattened fitness out), else one individual at a time with its
+    fitness function
+    Parameters
+    ----------
+    - problem: the problem, pygmo-like, i.e. providing fitness(x)
+        and/or batch_fitness(dvs)
+    - individuals: a numpy ndarray of dimension (nb_individuals, dim)
+    Return
+    ------
+    - the fitness of the individuals as a numpy ndarray of dimension
+        (nb_individuals, )
+    '''
+    if hasattr(problem, "batch_fitness"):
+        return(np.asarray(problem.batch_fitness(np.ravel(individuals)),
+                          dtype=np.float64))
+    return(np.array([problem.fitness(individual)[0]
+                     for individual in individuals], dtype=np.float64))
@@ -22,6 +22,14 @@ class Shifted_sphere:
         f = (np.square(x - self.o)).sum() + self.BIAS
         return(f,)
 
+    def batch_fitness(self, dvs):
+        x = np.reshape(dvs, (-1, self.dim))
+        f = (np.square(x - self.o)).sum(axis=1) + self.BIAS
+        return(f)
+
+    def has_batch_fitness(self):
+        return(True)
+
     def get_bounds(self):
         return([-100] * self.dim, [100] * self.dim)
 
@@ -47,6 +55,14 @@ class Shifted_schwefel:
         f = (np.absolute(x - self.o)).max() + self.BIAS
         return(f,)
 
+    def batch_fitness(self, dvs):
+        x = np.reshape(dvs, (-1, self.dim))
+        f = (np.absolute(x - self.o)).max(axis=1) + self.BIAS
+        return(f)
+
+    def has_batch_fitness(self):
+        return(True)
+
     def get_bounds(self):
         return([-100] * self.dim, [100] * self.dim)
 
@@ -74,6 +90,16 @@ class Shifted_rosenbrock:
                     + np.square(z[:-1] - 1))) + self.BIAS
         return(f,)
 
+    def batch_fitness(self, dvs):
+        x = np.reshape(dvs, (-1, self.dim))
+        z = x - self.o + 1
+        f = np.sum((100*np.square(np.square(z[:, :-1]) - z[:, 1:])
+                    + np.square(z[:, :-1] - 1)), axis=1) + self.BIAS
+        return(f)
+
+    def has_batch_fitness(self):
+        return(True)
+
     def get_bounds(self):
         return([-100] * self.dim, [100] * self.dim)
 
@@ -100,6 +126,16 @@ class Shifted_rastrigin:
         f = np.sum((np.square(z) - 10*np.cos(2*np.pi*z) + 10)) + self.BIAS
         return(f,)
 
+    def batch_fitness(self, dvs):
+        x = np.reshape(dvs, (-1, self.dim))
+        z = x - self.o
+        f = np.sum((np.square(z) - 10*np.cos(2*np.pi*z) + 10), axis=1)\
+            + self.BIAS
+        return(f)
+
+    def has_batch_fitness(self):
+        return(True)
+
     def get_bounds(self):
         return([-5] * self.dim, [5] * self.dim)
 
@@ -128,6 +164,17 @@ class Shifted_griewank:
             + 1 + self.BIAS
         return(f,)
 
+    def batch_fitness(self, dvs):
+        x = np.reshape(dvs, (-1, self.dim))
+        z = x - self.o
+        sqrt_z_i = np.sqrt(np.arange(1, self.dim+1))
+        f = np.sum((np.square(z)/4000), axis=1)\
+            - np.prod(np.cos(z/sqrt_z_i), axis=1) + 1 + self.BIAS
+        return(f)
+
+    def has_batch_fitness(self):
+        return(True)
+
     def get_bounds(self):
         return([-600] * self.dim, [600] * self.dim)
 
@@ -156,6 +203,18 @@ class Shifted_ackley:
             + 20 + np.e + self.BIAS
         return(f,)
 
+    def batch_fitness(self, dvs):
+        x = np.reshape(dvs, (-1, self.dim))
+        z = x - self.o
+        f = -20 * np.exp(-0.2*np.sqrt(np.sum(np.square(z), axis=1)
+                                      / self.dim))\
+            - np.exp(np.sum(np.cos(2*np.pi*z), axis=1)/self.dim)\
+            + 20 + np.e + self.BIAS
+        return(f)
+
+    def has_batch_fitness(self):
+        return(True)
+
     def get_bounds(self):
         return([-32] * self.dim, [32] * self.dim)
 
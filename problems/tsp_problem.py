@@ -1,18 +1,60 @@
 import numpy as np
 from decimal import localcontext, Decimal, ROUND_HALF_UP
 
+# Numba is optional, see TSP_Problem.set_backend
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return(func)
+        return(decorator)
+
+
+@njit(parallel=True, cache=True)
+def tour_lengths(dist_matrix, paths):
+    '''
+    Compute the length of several paths, one path at a time, without
+    building the (nb_paths, DIM) matrix of distances
+    Parameters
+    ----------
+    - dist_matrix: the (DIM + 1, DIM + 1) distance matrix indexed by
+      city numbers (see TSP_Problem.cities_dist_matrix)
+    - paths: a ndarray of dimension (nb_paths, DIM) of city numbers
+    Return
+    ------
+    - the lengths of the paths, of dimension (nb_paths, )
+    '''
+    nb_paths, dim = paths.shape
+    lengths = np.zeros(nb_paths)
+    for i in prange(nb_paths):
+        length = 0
+        for k in range(dim):
+            length += dist_matrix[paths[i, k], paths[i, (k + 1) % dim]]
+        lengths[i] = length
+    return(lengths)
+
 
 class TSP_Problem:
     '''
     A Travelling Salesman Problem.
 
     '''
-    def __init__(self, problem_name, cities_coords):
+    # number of edges whose distances are gathered at once by fitness
+    FITNESS_CHUNK = 32768
+
+    def __init__(self, problem_name, cities_coords, backend="numpy"):
         '''
         expecting an array of cities with each
         city's (x,y) coordinate
         cities are numbered from 1 to DIM
         Dimension of the array is therefore (DIM, 2)
+        The backend of the fitness is one of ("numpy", "numba"),
+        see set_backend
         '''
         self.type = "DISCRETE"
         self.dim = cities_coords.shape[0]
@@ -20,6 +62,37 @@ class TSP_Problem:
         self.cities_coords = cities_coords
         self.problem_name = problem_name
 
+        # (DIM + 1, DIM + 1) matrix of all the rounded half-up
+        # distances between cities, computed once. It is indexed
+        # directly by city numbers (row and column 0 are unused),
+        # so that paths of any (small) integer dtype can be used as
+        # indexes as-is, see dist_matrix for the (DIM, DIM) view
+        self.cities_dist_matrix = np.zeros((self.dim + 1, self.dim + 1),
+                                           dtype=np.int64)
+        self.cities_dist_matrix[1:, 1:] = self.get_distance_matrix()
+        self.set_backend(backend)
+
+    def set_backend(self, backend):
+        '''
+        Select how the fitness is computed:
+        - "numpy": all the paths at once with numpy fancy indexing
+        - "numba": path by path with a compiled (and parallel) loop,
+            if numba is installed (else "numpy" is used)
+        '''
+        if backend not in ("numpy", "numba"):
+            raise NotImplementedError
+        if not NUMBA_AVAILABLE:
+            backend = "numpy"
+        self.backend = backend
+
+    @property
+    def dist_matrix(self):
+        '''
+        The (DIM, DIM) distance matrix: the distance between city
+        number 'i' and city number 'j' is at [i - 1, j - 1]
+        '''
+        return(self.cities_dist_matrix[1:, 1:])
+
     def get_distance_int(self, city1, city2):
         '''
         compute the euclidean distance (Norm2)
@@ -42,6 +115,53 @@ class TSP_Problem:
 
         return int(distance)
 
+    def get_distance_matrix(self):
+        '''
+        compute the euclidean distance (Norm2) between
+        every pair of cities. The distances are rounded
+        half-up (i.e. 2.5 -> 3) exactly as get_distance_int
+        does, i.e. d -> floor(d) + 1 if d - floor(d) >= 0.5
+        (d - floor(d) is exact in floating point arithmetic)
+        Return
+        ------
+        - the distance matrix as a numpy ndarray of int of
+          dimension (DIM, DIM). The distance between city
+          number 'i' and city number 'j' is at [i - 1, j - 1]
+        '''
+        coords = self.cities_coords
+        distances = np.linalg.norm(coords[:, np.newaxis, :]
+                                   - coords[np.newaxis, :, :], axis=2)
+
+        # round half up
+        distances_floor = np.floor(distances)
+        distances = distances_floor + \
+            ((distances - distances_floor) >= 0.5)
+
+        return distances.astype(np.int64)
+
+    def get_neighbours(self, nb_neighbours):
+        '''
+        compute the nb_neighbours nearest cities of every city,
+        using the euclidean distance between cities coordinates
+        Parameters
+        ----------
+        - nb_neighbours: the number of neighbours of every city
+        Return
+        ------
+        - the neighbours as a numpy ndarray of dimension
+          (DIM, nb_neighbours), closest first. The neighbours of city
+          number 'i' are at [i - 1] and are city numbers too
+        '''
+        nb_neighbours = min(nb_neighbours, self.dim - 1)
+        coords = self.cities_coords
+        distances = np.linalg.norm(coords[:, np.newaxis, :]
+                                   - coords[np.newaxis, :, :], axis=2)
+        # a city is not its own neighbour
+        np.fill_diagonal(distances, np.inf)
+
+        neighbours = np.argsort(distances, axis=1, kind="stable")
+        return(neighbours[:, :nb_neighbours] + 1)
+
     def get_distance(self, city1, city2):
         '''
         a "float variation" of the computation of the
@@ -73,30 +193,111 @@ class TSP_Problem:
             representing the fitness of the paths of the current
             generation
         '''
+        if self.backend == "numba":
+            return(tour_lengths(self.cities_dist_matrix, paths))
 
-        # a Vector of size (population_size, ) to hold
-        # fitness values of the entire population (all paths)
-        population_size = paths.shape[0]
-        fitness = -1*np.ones(population_size)
+        # cities in TSP files are numerated from 1 to DIM, and
+        # self.cities_dist_matrix is indexed by city numbers: the
+        # paths are used as indexes as they are, whatever their dtype
+        # (no shifted copy of the paths)
 
-        for idx in range(population_size):
-            path = paths[idx]
+        # gather the distances of all the edges of all
+        # the paths at once, i.e. from path[k] to path[k + 1]
+        # and finally back to the first city, i.e. from
+        # path[-1] to path[0]. The paths are handled by chunks of
+        # about FITNESS_CHUNK edges, so that the gathered distances
+        # do not grow with the number of paths
+        fitness = np.empty(paths.shape[0])
+        chunk = max(self.FITNESS_CHUNK // self.dim, 1)
+        for start in range(0, paths.shape[0], chunk):
+            chunk_paths = paths[start:start + chunk]
+            distances = self.cities_dist_matrix[chunk_paths[:, :-1],
+                                                chunk_paths[:, 1:]]
+            fitness[start:start + chunk] = distances.sum(axis=1) + \
+                self.cities_dist_matrix[chunk_paths[:, -1],
+                                        chunk_paths[:, 0]]
 
-            distance = 0
-            for city1, city2 in zip(path, path[1:]):
-                # cities in TSP files are numerated from
-                # 1 to DIM. However self.cities being indexed
-                # starting with 0, coordinate of city number 'i'
-                # is at self.cities[i - 1]
-                d = self.get_distance_int(self.cities_coords[city1 - 1],
-                                          self.cities_coords[city2 - 1])
-                distance = distance + d
+        return(fitness)
 
-            # Finally adding the distance back to the first city
-            # I.e. distance from path[0] to path[-1]
-            d = self.get_distance_int(self.cities_coords[path[0] - 1],
-                                      self.cities_coords[path[-1] - 1])
-            distance = distance + d
-            fitness[idx] = distance
+    def batch_fitness(self, dvs):
+        '''
+        Compute the fitness of several paths given as one flattened
+        array (pygmo's batch fitness protocol, see fitness)
+        '''
+        return(self.fitness(np.reshape(dvs, (-1, self.dim))))
 
-        return(fitness)
+    def fitness_delta(self, paths, idxs, positions, genes):
+        '''
+        Compute the variation of the fitness of the paths[idxs] that
+        have been modified in a few positions only (e.g. by a mutation),
+        by only looking at the edges adjacent to the changed positions.
+        Parameters
+        ----------
+        - paths: a ndarray of dimension (population_size, dimension)
+            containing the modified paths
+        - idxs: the indexes of the modified paths, of dimension (m, )
+        - positions: the positions of the cities that have been changed
+            in each modified path, of dimension (m, k). Unused positions
+            are set to -1
+        - genes: the cities at these positions BEFORE the modification,
+            of dimension (m, k)
+        Return
+        ------
+        - delta: the fitness variation vector of dimension (m, ), i.e.
+            fitness(modified path) - fitness(path before modification)
+        '''
+        # sort the changed positions of each path, unused ones (and
+        # duplicates) last, the genes along
+        key = np.where(positions >= 0, positions, self.dim)
+        order = np.argsort(key, axis=1)
+        key = np.take_along_axis(key, order, axis=1)
+        duplicated = np.zeros(key.shape, dtype=bool)
+        duplicated[:, 1:] = key[:, 1:] == key[:, :-1]
+        if duplicated.any():
+            key[duplicated] = self.dim
+            resorted = np.argsort(key, axis=1, kind="stable")
+            key = np.take_along_axis(key, resorted, axis=1)
+            order = np.take_along_axis(order, resorted, axis=1)
+        genes = np.take_along_axis(genes, order, axis=1)
+        valid = key < self.dim
+        positions = np.where(valid, key, 0)
+
+        # for a changed position p, the edges (p - 1, p) and (p, p + 1)
+        # are the ones that may have changed. Once sorted, p - 1 (resp.
+        # p + 1) is a changed position only if it is the previous (resp.
+        # next) changed position, cyclically among the used ones: then
+        # its old city is the previous (resp. next) recorded gene, and
+        # the edge (p, p + 1) is counted as the edge (p' - 1, p') of the
+        # next changed position p' only
+        nb_valid = valid.sum(axis=1, keepdims=True)
+        k = np.arange(positions.shape[1])
+        previous = np.where(k == 0, nb_valid - 1, k - 1) % positions.shape[1]
+        following = np.where(k == nb_valid - 1, 0, k + 1) \
+            % positions.shape[1]
+        positions_previous = (positions - 1) % self.dim
+        positions_next = (positions + 1) % self.dim
+        previous_changed = valid & (np.take_along_axis(
+            positions, previous, axis=1) == positions_previous)
+        next_changed = valid & (np.take_along_axis(
+            positions, following, axis=1) == positions_next)
+
+        # cities around the changed positions in the modified paths
+        rows = idxs[:, np.newaxis]
+        new_city = paths[rows, positions]
+        new_city_previous = paths[rows, positions_previous]
+        new_city_next = paths[rows, positions_next]
+
+        # cities before the position in the paths before modification
+        old_city_previous = np.where(
+            previous_changed,
+            np.take_along_axis(genes, previous, axis=1),
+            new_city_previous)
+
+        distances = self.cities_dist_matrix
+        delta = ((distances[new_city_previous, new_city] -
+                  distances[old_city_previous, genes]) * valid).sum(axis=1)
+        delta += ((distances[new_city, new_city_next] -
+                   distances[genes, new_city_next]) *
+                  (valid & ~next_changed)).sum(axis=1)
+
+        return(delta.astype(np.float64))